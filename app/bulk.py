@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.db import SessionLocal, init_db, write_session
+from app.models import BrandInsights
+from app.schemas import BulkRun, BulkItem
+from app.pipeline import CatalogWriter, normalize_store_url, scrape_insights_within, upsert_insights
+from app.transport import close_transport
+
+logger = logging.getLogger(__name__)
+
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "16"))
+BULK_MAX_PER_HOST = int(os.getenv("BULK_MAX_PER_HOST", "1"))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "25"))
+BULK_STORE_DEADLINE = float(os.getenv("BULK_STORE_DEADLINE", "90"))
+BULK_FAILURES_REPORTED = 100
+
+# (item id, url, scraped insights and their catalog writer, error) for one finished store
+BatchResult = Tuple[int, str, Optional[Tuple[BrandInsights, CatalogWriter]], Optional[str]]
+
+def read_url_file(path: str) -> List[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def create_run(urls: Iterable[str]) -> str:
+    unique = list(dict.fromkeys(u for u in (normalize_store_url(url) for url in urls) if u))
+    db: Session = SessionLocal()
+    try:
+        run = BulkRun(id=uuid.uuid4().hex, status="pending", total=len(unique))
+        db.add(run)
+        db.flush()
+        db.bulk_insert_mappings(BulkItem, [{"run_id": run.id, "website_url": url, "status": "pending"} for url in unique])
+        db.commit()
+        return run.id
+    finally:
+        db.close()
+
+def start_run(run_id: str) -> List[Tuple[int, str]]:
+    # Marks the run as running and returns the items not yet checkpointed
+    with write_session() as db:
+        run = db.query(BulkRun).filter(BulkRun.id == run_id).first()
+        if run is None:
+            raise KeyError(run_id)
+        run.status = "running"
+        run.started_at = datetime.now(timezone.utc)
+        run.finished_at = None
+        items = (db.query(BulkItem.id, BulkItem.website_url)
+                 .filter(BulkItem.run_id == run_id, BulkItem.status == "pending")
+                 .order_by(BulkItem.id)
+                 .all())
+        return [(item_id, url) for item_id, url in items]
+
+def finish_run(run_id: str, status: str) -> None:
+    db: Session = SessionLocal()
+    try:
+        db.query(BulkRun).filter(BulkRun.id == run_id).update(
+            {"status": status, "finished_at": datetime.now(timezone.utc)})
+        db.commit()
+    finally:
+        db.close()
+
+def interleave_by_host(items: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    # Round-robin across hosts so one store with many entries cannot monopolise the workers
+    by_host: "collections.OrderedDict[str, collections.deque]" = collections.OrderedDict()
+    for item in items:
+        by_host.setdefault(urlsplit(item[1]).netloc.lower(), collections.deque()).append(item)
+    ordered = []
+    while by_host:
+        for host in list(by_host):
+            ordered.append(by_host[host].popleft())
+            if not by_host[host]:
+                del by_host[host]
+    return ordered
+
+def write_batch(run_id: str, results: List[BatchResult]) -> None:
+    # One transaction per batch: insights for successes plus the checkpoint for every item
+    with write_session() as db:
+        now = datetime.now(timezone.utc)
+        succeeded = failed = 0
+        for item_id, url, scraped, error in results:
+            fields = {"finished_at": now}
+            if scraped is not None:
+                # The catalog pages were saved during the scrape; this finishes the brand's record
+                fields.update(status="succeeded", brand_id=upsert_insights(db, url, *scraped))
+                succeeded += 1
+            else:
+                fields.update(status="failed", error=error)
+                failed += 1
+            db.query(BulkItem).filter(BulkItem.id == item_id).update(fields)
+        db.query(BulkRun).filter(BulkRun.id == run_id).update({
+            "succeeded": BulkRun.succeeded + succeeded,
+            "failed": BulkRun.failed + failed,
+        })
+
+def write_batch_checked(run_id: str, results: List[BatchResult]) -> None:
+    # A failed batch is retried one store at a time, so one bad write only fails its own item.
+    # Only an item whose failure cannot be recorded either (the database is gone) raises.
+    try:
+        write_batch(run_id, results)
+        return
+    except SQLAlchemyError:
+        logger.exception("Bulk run %s: batch of %d failed to save; retrying item by item", run_id, len(results))
+    for item_id, url, scraped, error in results:
+        try:
+            write_batch(run_id, [(item_id, url, scraped, error)])
+        except SQLAlchemyError as e:
+            logger.exception("Bulk run %s: could not save %s", run_id, url)
+            write_batch(run_id, [(item_id, url, None, f"Could not save: {type(e).__name__}: {e}")])
+
+def run_summary(run_id: str) -> Optional[dict]:
+    db: Session = SessionLocal()
+    try:
+        run = db.query(BulkRun).filter(BulkRun.id == run_id).first()
+        if run is None:
+            return None
+        throughput = None
+        if run.started_at is not None:
+            started = run.started_at if run.started_at.tzinfo else run.started_at.replace(tzinfo=timezone.utc)
+            ended = run.finished_at or datetime.now(timezone.utc)
+            ended = ended if ended.tzinfo else ended.replace(tzinfo=timezone.utc)
+            finished_since_start = (db.query(BulkItem)
+                                    .filter(BulkItem.run_id == run_id, BulkItem.status != "pending",
+                                            BulkItem.finished_at >= run.started_at)
+                                    .count())
+            elapsed = max((ended - started).total_seconds(), 1e-6)
+            throughput = round(finished_since_start / elapsed * 60, 2)
+        failures = (db.query(BulkItem.website_url, BulkItem.error)
+                    .filter(BulkItem.run_id == run_id, BulkItem.status == "failed")
+                    .order_by(BulkItem.id)
+                    .limit(BULK_FAILURES_REPORTED)
+                    .all())
+        return {
+            "id": run.id,
+            "status": run.status,
+            "total": run.total,
+            "succeeded": run.succeeded,
+            "failed": run.failed,
+            "pending": run.total - run.succeeded - run.failed,
+            "stores_per_minute": throughput,
+            "created_at": run.created_at,
+            "started_at": run.started_at,
+            "finished_at": run.finished_at,
+            "failures": [{"website_url": url, "error": error} for url, error in failures],
+        }
+    finally:
+        db.close()
+
+async def run_bulk(run_id: str, workers: int = BULK_WORKERS, batch_size: int = BULK_BATCH_SIZE,
+                   max_per_host: int = BULK_MAX_PER_HOST) -> Optional[dict]:
+    items = interleave_by_host(await asyncio.to_thread(start_run, run_id))
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    host_limits: Dict[str, asyncio.Semaphore] = collections.defaultdict(lambda: asyncio.Semaphore(max_per_host))
+    buffer: List[BatchResult] = []
+    write_lock = asyncio.Lock()
+
+    async def flush() -> None:
+        async with write_lock:
+            if buffer:
+                batch = buffer[:]
+                del buffer[:]
+                await asyncio.to_thread(write_batch_checked, run_id, batch)
+
+    async def scrape(item_id: int, url: str) -> None:
+        try:
+            catalog = CatalogWriter(url, keep=False)
+            async with host_limits[urlsplit(url).netloc.lower()]:
+                insights, complete = await scrape_insights_within(url, BULK_STORE_DEADLINE, catalog=catalog)
+            if not complete:
+                buffer.append((item_id, url, None, f"Timed out after {BULK_STORE_DEADLINE:g}s"))
+            elif not catalog.count:
+                buffer.append((item_id, url, None, "Website not found or no products available."))
+            elif catalog.failed:
+                buffer.append((item_id, url, None, "Could not save the product catalog."))
+            else:
+                buffer.append((item_id, url, (insights, catalog), None))
+        except Exception as e:
+            buffer.append((item_id, url, None, f"{type(e).__name__}: {e}"))
+        if len(buffer) >= batch_size:
+            await flush()
+
+    async def worker() -> None:
+        while True:
+            try:
+                item_id, url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await scrape(item_id, url)
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(max(1, workers))]
+    try:
+        await asyncio.gather(*tasks)
+        await flush()
+    except BaseException:
+        # No worker keeps scraping or writing once the run is marked interrupted and can be resumed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Keep whatever finished; the rest stays pending for a resume
+        await asyncio.shield(flush())
+        await asyncio.to_thread(finish_run, run_id, "interrupted")
+        raise
+    await asyncio.to_thread(finish_run, run_id, "finished")
+    return await asyncio.to_thread(run_summary, run_id)
+
+_background_runs: Dict[str, asyncio.Task] = {}
+
+def is_running(run_id: str) -> bool:
+    return run_id in _background_runs
+
+def start_background_run(run_id: str) -> None:
+    task = asyncio.ensure_future(run_bulk(run_id))
+    _background_runs[run_id] = task
+    task.add_done_callback(lambda _: _background_runs.pop(run_id, None))
+
+async def cancel_background_runs() -> None:
+    # Cancelled runs checkpoint what they finished and can be resumed after a restart
+    tasks = list(_background_runs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _report_progress(run_id: str, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        summary = await asyncio.to_thread(run_summary, run_id)
+        print(f"[bulk {run_id}] {summary['succeeded']} ok, {summary['failed']} failed, "
+              f"{summary['pending']} pending, {summary['stores_per_minute']} stores/min", file=sys.stderr)
+
+async def _main(args: argparse.Namespace) -> dict:
+    if args.resume:
+        run_id = args.resume
+    else:
+        urls = list(args.urls)
+        if args.file:
+            urls += read_url_file(args.file)
+        run_id = await asyncio.to_thread(create_run, urls)
+        print(f"[bulk {run_id}] created run", file=sys.stderr)
+    reporter = asyncio.ensure_future(_report_progress(run_id, args.progress_interval))
+    try:
+        return await run_bulk(run_id, workers=args.workers, batch_size=args.batch_size, max_per_host=args.max_per_host)
+    finally:
+        reporter.cancel()
+        await close_transport()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Scrape many Shopify stores into the insights database.")
+    parser.add_argument("urls", nargs="*", help="store URLs")
+    parser.add_argument("-f", "--file", help="file with one store URL per line")
+    parser.add_argument("--resume", metavar="RUN_ID", help="continue an interrupted run")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--max-per-host", type=int, default=BULK_MAX_PER_HOST)
+    parser.add_argument("--progress-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    if not (args.urls or args.file or args.resume):
+        parser.error("give store URLs, --file or --resume")
+    init_db()
+    try:
+        summary = asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        print("Interrupted; finished stores are saved. Continue with --resume RUN_ID.", file=sys.stderr)
+        return 130
+    print(json.dumps(summary, default=str, indent=2))
+    return 0 if summary and summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,150 @@
-from sqlalchemy import create_engine
+import asyncio
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./shopify_insights.db"
+def load_env_file(path: str = ".env") -> None:
+    # python-dotenv is only imported when there is a file for it to read
+    if os.path.exists(path):
+        from dotenv import load_dotenv
+        load_dotenv(path)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+load_env_file()
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./shopify_insights.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Async endpoints use an AsyncSession when set; needs aiosqlite or asyncpg (and greenlet) installed
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def engine_options(url: str) -> dict:
+    options: dict = {"echo": DB_ECHO}
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if make_url(url).database in (None, "", ":memory:"):
+            return options
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                   pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+    return options
+
+def configure_sqlite(engine: Engine) -> None:
+    # pysqlite's own transaction handling is switched off so SQLAlchemy emits BEGIN itself;
+    # write sessions then take the write lock up front (BEGIN IMMEDIATE) and wait on busy_timeout
+    # instead of failing when a read transaction tries to upgrade.
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.get_execution_options().get("sqlite_immediate") else "BEGIN")
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+if is_sqlite(SQLALCHEMY_DATABASE_URL):
+    configure_sqlite(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine.execution_options(sqlite_immediate=True))
 Base = declarative_base()
 
-try:
-    from app import schemas 
-except ImportError:
-    pass
+@contextmanager
+def write_session() -> Iterator[Session]:
+    # One transaction for a unit of writes: committed on success, rolled back on error
+    db = WriteSessionLocal()
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+_async_sessionmaker = None
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else url
+
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        url = async_database_url(SQLALCHEMY_DATABASE_URL)
+        async_engine = create_async_engine(url, **engine_options(url))
+        if is_sqlite(url):
+            configure_sqlite(async_engine.sync_engine)
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+async def run_db(fn: Callable[..., Any], *args: Any, write: bool = False) -> Any:
+    # Runs fn(session, *args) in its own session from async code: on an AsyncSession when DB_ASYNC is set,
+    # otherwise on a worker thread. Write calls are committed as one transaction.
+    if DB_ASYNC:
+        options = {"sqlite_immediate": True} if write else {}
+        async with get_async_sessionmaker()() as session:
+            if options:
+                await session.connection(execution_options=options)
+            result = await session.run_sync(fn, *args)
+            if write:
+                await session.commit()
+            return result
+
+    def call() -> Any:
+        if write:
+            with write_session() as db:
+                return fn(db, *args)
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    return await asyncio.to_thread(call)
+
+def add_missing_columns():
+    # create_all never alters existing tables; add columns introduced after a table was created
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                    ))
+
+def add_missing_indexes():
+    # create_all skips the indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
-Base.metadata.create_all(bind=engine) 
+def init_db():
+    # Creates missing tables, columns and indexes; called once at startup rather than on import
+    from app import schemas  # noqa: F401  registers the tables on Base.metadata
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    add_missing_indexes()
@@ -0,0 +1,174 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app import metrics
+from app.parsing import classify_links, make_soup
+from app.text_prep import page_text
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for parsing and extraction, one per CPU up to 4 unless set; 0 runs them on the event loop
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS") or min(os.cpu_count() or 1, 4))
+
+# Emails and phone-number candidates in one scan of the page text. The email domain's first label has
+# no digits, which also rules out asset names like lazysizes@1.8.2. A phone candidate is 7+ digits with
+# at most three separators between them; only those spans go through phonenumbers.
+CONTACT_SPANS = re.compile(
+    r"(?P<email>[a-zA-Z0-9_.+-]+@[a-zA-Z-]+\.[a-zA-Z0-9-.]+)"
+    r"|(?P<phone>\+?\(?\d(?:[\s().\-/]{0,3}\d){6,})"
+)
+PHONE_REGION = "IN"
+FAQ_KEEP_TAGS = ('button',)
+NOISE_TAGS = ['script', 'style', 'noscript', 'svg', 'meta', 'head', 'title', 'link']
+# Parsers the app imports lazily; loaded once in the forkserver for workers, or by preload() in this process
+WORKER_PRELOAD = [__name__, 'bs4', 'lxml.etree', 'phonenumbers']
+
+# Everything below takes page HTML and returns plain data, so it can run in a worker process
+
+def find_contacts(text: str) -> Dict[str, List[str]]:
+    import phonenumbers
+    emails = []
+    phones = []
+    for match in CONTACT_SPANS.finditer(text):
+        if match.lastgroup == 'email':
+            emails.append(match.group())
+            continue
+        # One character either side keeps the matcher's check for letters touching the number
+        span = text[max(match.start() - 1, 0):match.end() + 1]
+        for number in phonenumbers.PhoneNumberMatcher(span, PHONE_REGION):
+            phones.append(phonenumbers.format_number(number.number, phonenumbers.PhoneNumberFormat.E164))
+    return {'emails': list(dict.fromkeys(emails)), 'phones': list(dict.fromkeys(phones))}
+
+def visible_text(soup) -> str:
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+def homepage(html: str, base_url: str) -> Dict[str, Any]:
+    # The homepage link classification and contact scan, from a single parse
+    soup = make_soup(html)
+    links = classify_links(soup, base_url)
+    text = visible_text(soup)
+    return {'links': links, 'text': text, **find_contacts(text)}
+
+def contact_page(html: str) -> Dict[str, Any]:
+    text = visible_text(make_soup(html))
+    return {'text': text, **find_contacts(text)}
+
+def main_text(html: str) -> str:
+    soup = make_soup(html)
+    main = soup.find('main') or soup.find('div', {'id': 'MainContent'}) or soup
+    return main.get_text(separator='\n', strip=True)
+
+def llm_text(html: str) -> str:
+    return page_text(make_soup(html))
+
+def keyword_section(html: str, keywords: Sequence[str], min_length: int = 50) -> Optional[str]:
+    # The first block of the page that mentions one of the keywords, tried keyword by keyword
+    soup = make_soup(html)
+    for kw in keywords:
+        for section in soup.find_all(['section', 'div', 'p']):
+            if section.get_text() and kw in section.get_text().lower():
+                text = section.get_text(separator='\n', strip=True)
+                if text and len(text) > min_length:
+                    return text
+    return None
+
+def faqs(html: str) -> Dict[str, Any]:
+    # Question/answer pairs from the common FAQ markups; the page text comes along when none are found
+    soup = make_soup(html)
+    found = []
+    for item in soup.find_all(class_=['faq', 'faq-item']):
+        q = item.find(['h2', 'h3', 'h4', 'strong', 'b'])
+        a = item.find('p')
+        if q and a:
+            found.append({'question': q.get_text(strip=True), 'answer': a.get_text(strip=True)})
+    for details in soup.find_all('details'):
+        summary = details.find('summary')
+        if summary:
+            answer = details.get_text(separator='\n', strip=True).replace(summary.get_text(strip=True), '').strip()
+            found.append({'question': summary.get_text(strip=True), 'answer': answer})
+    for q in soup.find_all(['h2', 'h3', 'h4', 'b', 'strong']):
+        next_p = q.find_next_sibling('p')
+        if next_p:
+            found.append({'question': q.get_text(strip=True), 'answer': next_p.get_text(strip=True)})
+        next_list = q.find_next_sibling(['ul', 'ol'])
+        if next_list:
+            answer = '\n'.join(li.get_text(strip=True) for li in next_list.find_all('li'))
+            found.append({'question': q.get_text(strip=True), 'answer': answer})
+    for li in soup.find_all('li'):
+        q = li.find(['strong', 'b'])
+        if q:
+            answer = li.get_text(strip=True).replace(q.get_text(strip=True), '').strip()
+            if answer:
+                found.append({'question': q.get_text(strip=True), 'answer': answer})
+    seen = set()
+    unique = []
+    for faq in found:
+        key = (faq['question'], faq['answer'])
+        if key not in seen and faq['question'] and faq['answer']:
+            unique.append(faq)
+            seen.add(key)
+    # Accordion FAQs keep their questions in <button> toggles, which are boilerplate on other pages
+    return {'faqs': unique, 'text': None if unique else page_text(soup, keep=FAQ_KEEP_TAGS)}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # forkserver children start from a clean process with this module preloaded, not a copy of
+        # the server's threads and sockets
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            context.set_forkserver_preload(WORKER_PRELOAD)
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=context)
+    return _pool
+
+def preload() -> None:
+    # Loads the parsers ahead of the first page when extraction runs in this process
+    for name in WORKER_PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+def _ready() -> bool:
+    return True
+
+def start_pool() -> None:
+    # Starts every worker up front so the first scrapes don't pay for process startup
+    if EXTRACT_WORKERS > 0:
+        pool = get_pool()
+        for future in [pool.submit(_ready) for _ in range(EXTRACT_WORKERS)]:
+            future.result()
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+async def run(fn: Callable[..., Any], *args: Any) -> Any:
+    start = time.perf_counter()
+    try:
+        if EXTRACT_WORKERS <= 0:
+            return fn(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died (killed or out of memory); this call runs here and the next one gets a fresh pool
+            logger.exception("Extraction pool broke running %s; restarting it", fn.__name__)
+            shutdown_pool()
+            return fn(*args)
+    finally:
+        metrics.observe("extract_seconds", time.perf_counter() - start, task=fn.__name__)
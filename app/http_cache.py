@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, NamedTuple, Optional
+
+import httpx
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "1") == "1"
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "./http_cache.db")
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", str(7 * 24 * 3600)))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Only these headers are replayed on a cache hit
+STORED_HEADERS = ("content-type", "etag", "last-modified")
+
+class CachedResponse(NamedTuple):
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.headers.get("etag"):
+            headers["If-None-Match"] = self.headers["etag"]
+        if self.headers.get("last-modified"):
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+    def to_response(self) -> httpx.Response:
+        return httpx.Response(self.status, headers=self.headers, content=self.body,
+                              request=httpx.Request("GET", self.url))
+
+class HTTPCache:
+    """SQLite-backed store of validated responses for conditional GETs, LRU-evicted by total body size."""
+
+    def __init__(self, path: str = HTTP_CACHE_PATH, ttl: float = HTTP_CACHE_TTL,
+                 max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            "url TEXT PRIMARY KEY, status INTEGER NOT NULL, headers TEXT NOT NULL, body BLOB NOT NULL, "
+            "size INTEGER NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_http_cache_accessed_at ON http_cache (accessed_at)")
+        # The total body size lives in the database, so every process sharing the file enforces max_bytes
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)"
+        )
+        with self._write():
+            self._conn.execute(
+                "INSERT OR IGNORE INTO http_cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM http_cache"
+            )
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        # Changes to the entries and their total commit together; IMMEDIATE serialises writers across processes
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _add_size(self, delta: int) -> None:
+        self._conn.execute("UPDATE http_cache_size SET total = total + ? WHERE id = 0", (delta,))
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, size, stored_at FROM http_cache WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, headers, body, size, stored_at = row
+            if now - stored_at > self.ttl:
+                with self._write():
+                    # Unless another process has replaced the entry meanwhile
+                    if self._conn.execute("DELETE FROM http_cache WHERE url = ? AND stored_at = ?",
+                                          (url, stored_at)).rowcount:
+                        self._add_size(-size)
+                return None
+            self._conn.execute("UPDATE http_cache SET accessed_at = ? WHERE url = ?", (now, url))
+        return CachedResponse(url, status, json.loads(headers), body)
+
+    def put(self, url: str, resp: httpx.Response) -> None:
+        headers = {k: resp.headers[k] for k in STORED_HEADERS if k in resp.headers}
+        if resp.status_code != 200 or not ("etag" in headers or "last-modified" in headers):
+            return
+        body = resp.content
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._write():
+            old = self._conn.execute("SELECT size FROM http_cache WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (url, status, headers, body, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, resp.status_code, json.dumps(headers), body, len(body), now, now),
+            )
+            self._add_size(len(body) - (old[0] if old else 0))
+            self._evict()
+
+    def revalidated(self, url: str, resp: httpx.Response) -> None:
+        # A 304 may carry fresher validators; keep them for the next request
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT headers FROM http_cache WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            headers = json.loads(row[0])
+            headers.update({k: resp.headers[k] for k in ("etag", "last-modified") if k in resp.headers})
+            self._conn.execute(
+                "UPDATE http_cache SET headers = ?, stored_at = ?, accessed_at = ? WHERE url = ?",
+                (json.dumps(headers), now, now, url),
+            )
+
+    def _evict(self) -> None:
+        # Runs inside put's transaction, so the total includes what other processes have written
+        size = self._conn.execute("SELECT total FROM http_cache_size WHERE id = 0").fetchone()[0]
+        while size > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT url, size FROM http_cache ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._conn.execute("UPDATE http_cache_size SET total = 0 WHERE id = 0")
+                return
+            self._conn.execute("DELETE FROM http_cache WHERE url = ?", (row[0],))
+            self._add_size(-row[1])
+            size -= row[1]
+
+    def clear(self) -> None:
+        with self._lock, self._write():
+            self._conn.execute("DELETE FROM http_cache")
+            self._conn.execute("UPDATE http_cache_size SET total = 0 WHERE id = 0")
+
+_http_cache: Optional[HTTPCache] = None
+
+def get_http_cache() -> Optional[HTTPCache]:
+    global _http_cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    if _http_cache is None:
+        _http_cache = HTTPCache()
+    return _http_cache
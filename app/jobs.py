@@ -0,0 +1,195 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.db import SessionLocal
+from app.schemas import ScrapeJob
+from app.pipeline import SECTIONS, CatalogWriter, scrape_insights, persist_insights
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+# A running job whose worker has not touched it for this long is taken to be abandoned and is queued again
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "300"))
+ACTIVE_STATUSES = ("queued", "running")
+
+def job_to_dict(job: ScrapeJob) -> dict:
+    return {
+        "id": job.id,
+        "website_url": job.website_url,
+        "status": job.status,
+        "progress": job.progress,
+        "total": job.total,
+        "error": job.error,
+        "brand_id": job.brand_id,
+        "insights_url": f"/brands/{job.brand_id}/insights" if job.brand_id else None,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+def get_job(job_id: str) -> Optional[dict]:
+    db: Session = SessionLocal()
+    try:
+        job = db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+def find_active_job(website_url: str) -> Optional[dict]:
+    db: Session = SessionLocal()
+    try:
+        job = (db.query(ScrapeJob)
+               .filter(ScrapeJob.website_url == website_url, ScrapeJob.status.in_(ACTIVE_STATUSES))
+               .order_by(ScrapeJob.created_at.desc())
+               .first())
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+def create_job(website_url: str) -> dict:
+    db: Session = SessionLocal()
+    try:
+        job = ScrapeJob(id=uuid.uuid4().hex, website_url=website_url, status="queued", progress=0, total=len(SECTIONS))
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job_to_dict(job)
+    finally:
+        db.close()
+
+def update_job(job_id: str, **fields) -> None:
+    db: Session = SessionLocal()
+    try:
+        db.query(ScrapeJob).filter(ScrapeJob.id == job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+def transition_job(job_id: str, from_status: str, **fields) -> bool:
+    # Updates the job only if it is still in from_status, so of several workers exactly one wins
+    db: Session = SessionLocal()
+    try:
+        fields.setdefault("updated_at", datetime.now(timezone.utc))
+        changed = (db.query(ScrapeJob)
+                   .filter(ScrapeJob.id == job_id, ScrapeJob.status == from_status)
+                   .update(fields, synchronize_session=False))
+        db.commit()
+        return changed == 1
+    finally:
+        db.close()
+
+def heartbeat(job_id: str) -> None:
+    update_job(job_id, updated_at=datetime.now(timezone.utc))
+
+def unfinished_jobs() -> List[Tuple[str, str]]:
+    # Queued jobs, plus running jobs whose worker stopped sending heartbeats, which are queued again
+    db: Session = SessionLocal()
+    try:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_AFTER)
+        (db.query(ScrapeJob)
+         .filter(ScrapeJob.status == "running", ScrapeJob.updated_at < cutoff)
+         .update({"status": "queued", "progress": 0}, synchronize_session=False))
+        db.commit()
+        jobs = (db.query(ScrapeJob.id, ScrapeJob.website_url)
+                .filter(ScrapeJob.status == "queued")
+                .order_by(ScrapeJob.created_at)
+                .all())
+        return [(job_id, website_url) for job_id, website_url in jobs]
+    finally:
+        db.close()
+
+class JobQueue:
+    """In-process worker pool for scrape jobs, with job state persisted in the app database."""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: Dict[str, str] = {}  # website_url -> job id
+        self._submit_lock: Optional[asyncio.Lock] = None
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._submit_lock = asyncio.Lock()
+        # Queued jobs and abandoned running ones are picked up again. Other processes may queue the same
+        # jobs; whichever worker claims a job first runs it.
+        for job_id, website_url in await asyncio.to_thread(unfinished_jobs):
+            if website_url in self._inflight:
+                await asyncio.to_thread(transition_job, job_id, "queued", status="failed",
+                                        error="Superseded by a duplicate job")
+                continue
+            self._inflight[website_url] = job_id
+            self._queue.put_nowait((job_id, website_url))
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, website_url: str) -> dict:
+        # A URL that is already queued or running joins the existing job
+        async with self._submit_lock:
+            job_id = self._inflight.get(website_url)
+            if job_id is not None:
+                return await asyncio.to_thread(get_job, job_id)
+            job = await asyncio.to_thread(find_active_job, website_url)
+            if job is not None:
+                return job
+            job = await asyncio.to_thread(create_job, website_url)
+            self._inflight[website_url] = job["id"]
+        await self._queue.put((job["id"], website_url))
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, website_url = await self._queue.get()
+            try:
+                await self._run(job_id, website_url)
+            finally:
+                self._inflight.pop(website_url, None)
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            await asyncio.to_thread(heartbeat, job_id)
+
+    async def _run(self, job_id: str, website_url: str) -> None:
+        if not await asyncio.to_thread(transition_job, job_id, "queued", status="running"):
+            return  # another worker claimed it
+        beat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            await self._scrape(job_id, website_url)
+        finally:
+            beat.cancel()
+
+    async def _scrape(self, job_id: str, website_url: str) -> None:
+        done = 0
+
+        async def on_section(name, value) -> None:
+            nonlocal done
+            done += 1
+            await asyncio.to_thread(update_job, job_id, progress=done)
+
+        try:
+            # Jobs only store the catalog, so it is saved page by page and never collected
+            catalog = CatalogWriter(website_url, keep=False)
+            insights = await scrape_insights(website_url, on_section, catalog)
+            if not catalog.count:
+                await asyncio.to_thread(update_job, job_id, status="failed",
+                                        error="Website not found or no products available.")
+                return
+            brand_id = await persist_insights(website_url, insights, catalog)
+            if brand_id is None:
+                await asyncio.to_thread(update_job, job_id, status="failed", error="Could not save insights.")
+                return
+            await asyncio.to_thread(update_job, job_id, status="succeeded", brand_id=brand_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await asyncio.to_thread(update_job, job_id, status="failed", error=str(e))
+
+job_queue = JobQueue()
@@ -0,0 +1,295 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.text_prep import count_tokens, prepare_llm_input
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "2048"))
+LLM_COMBINE_FALLBACKS = os.getenv("LLM_COMBINE_FALLBACKS", "0") == "1"
+LLM_BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW", "0.5"))
+
+# Per-brand fallback extractions: instruction placed before the page text, and the completion budget
+LLM_TASKS = {
+    'faqs': (
+        "Extract all FAQ question and answer pairs from the following text. "
+        "Return as a JSON array of objects with 'question' and 'answer'. "
+        "Text:\n",
+        512,
+    ),
+    'contact': (
+        "Extract all email addresses and phone numbers from the following text. "
+        "Return them as a JSON object with 'emails' and 'phones' fields. "
+        "Text:\n",
+        256,
+    ),
+    'about': (
+        "Summarize the following text as a concise brand description suitable for an 'About Us' section. "
+        "Return only the summary text.\nText:\n",
+        256,
+    ),
+}
+
+COMBINED_INSTRUCTION = (
+    "You are given text from several pages of one online store, each under a '### <section>' heading. "
+    "Return a single JSON object with one key per section present: "
+    "'faqs' is a JSON array of objects with 'question' and 'answer' extracted from the faqs text; "
+    "'contact' is a JSON object with 'emails' and 'phones' fields extracted from the contact text; "
+    "'about' is a concise brand description suitable for an 'About Us' section, summarizing the about text. "
+    "Return only the JSON object.\n"
+)
+
+def normalize_text(text: str) -> str:
+    lines = (re.sub(r'\s+', ' ', line).strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def cache_key(model: str, instruction: str, text: str) -> str:
+    payload = json.dumps([model, instruction, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    """Completions keyed by sha256(model, instruction, normalized text): in-memory LRU in front of SQLite."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, memory_items: int = LLM_CACHE_MEMORY_ITEMS):
+        self.memory_items = memory_items
+        self._memory: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, model TEXT NOT NULL, "
+            "response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def _remember(self, key: str, response: str) -> None:
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._memory:
+                return None
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+    def get(self, key: str) -> Optional[str]:
+        hit = self.get_memory(key)
+        if hit is not None:
+            return hit
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    async def lookup(self, key: str) -> Optional[str]:
+        # Memory hits are served inline; SQLite is read on a worker thread, like put, so a busy or
+        # locked cache file never blocks the event loop
+        hit = self.get_memory(key)
+        if hit is not None:
+            return hit
+        return await asyncio.to_thread(self.get, key)
+
+    def put(self, key: str, model: str, response: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time()),
+            )
+            self._remember(key, response)
+
+_cache: Optional[LLMCache] = None
+_client: Optional["openai.AsyncOpenAI"] = None
+_client_loop = None
+
+def get_llm_cache() -> Optional[LLMCache]:
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
+
+def get_client() -> "openai.AsyncOpenAI":
+    # One client (and connection pool) per event loop; OPENAI_BASE_URL points it at a fake endpoint in tests.
+    # The SDK is imported on first use, it is the slowest import in the app.
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        import openai
+        _client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        _client_loop = loop
+    return _client
+
+async def complete(instruction: str, text: str, max_tokens: int, model: str = LLM_MODEL,
+                   task: str = 'custom') -> Optional[str]:
+    text = normalize_text(text)
+    key = cache_key(model, instruction, text)
+    cache = get_llm_cache()
+    if cache is not None:
+        hit = await cache.lookup(key)
+        if hit is not None:
+            metrics.inc("llm_requests_total", task=task, cache="hit")
+            return hit
+    metrics.inc("llm_requests_total", task=task, cache="miss")
+    metrics.inc("llm_input_tokens_total", count_tokens(instruction) + count_tokens(text), task=task)
+    start = time.perf_counter()
+    try:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": instruction + text}],
+            max_tokens=max_tokens,
+            temperature=0
+        )
+        content = response.choices[0].message.content
+    except Exception as e:
+        logger.warning("LLM %s completion failed: %s: %s", task, type(e).__name__, e)
+        metrics.inc("llm_errors_total", task=task, error=type(e).__name__)
+        return None
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("llm_request_seconds", elapsed, task=task)
+        metrics.record_stage(metrics.stage.get(), llm_calls=1, llm_seconds=elapsed)
+    if cache is not None and content is not None:
+        await asyncio.to_thread(cache.put, key, model, content)
+    return content
+
+async def run_task(kind: str, text: str) -> Optional[str]:
+    instruction, max_tokens = LLM_TASKS[kind]
+    chunks = prepare_llm_input(kind, text)
+    if len(chunks) == 1:
+        return await complete(instruction, chunks[0], max_tokens, task=kind)
+    # Map each chunk separately, then reduce the partial answers into one
+    partials = await asyncio.gather(*(complete(instruction, chunk, max_tokens, task=kind) for chunk in chunks))
+    if kind == 'faqs':
+        faqs, seen = [], set()
+        for faq in (faq for content in partials for faq in parse_faqs(content)):
+            if faq['question'] not in seen:
+                seen.add(faq['question'])
+                faqs.append(faq)
+        return json.dumps(faqs)
+    if kind == 'contact':
+        merged = {"emails": [], "phones": []}
+        for content in partials:
+            found = parse_contact(content)
+            for field in merged:
+                merged[field].extend(v for v in found[field] if v not in merged[field])
+        return json.dumps(merged)
+    summaries = '\n'.join(content.strip() for content in partials if content)
+    if not summaries:
+        return None
+    return await complete(instruction, summaries, max_tokens, task=kind)
+
+async def run_combined(texts: Dict[str, str], model: str = LLM_MODEL) -> Dict[str, Optional[str]]:
+    # One structured request for several fallbacks; each section is also cached under its own key
+    cache = get_llm_cache()
+    texts = {kind: normalize_text(prepare_llm_input(kind, text, max_chunks=1)[0]) for kind, text in texts.items()}
+    results: Dict[str, Optional[str]] = {}
+    missing: Dict[str, str] = {}
+    for kind, text in texts.items():
+        hit = await cache.lookup(cache_key(model, LLM_TASKS[kind][0], text)) if cache is not None else None
+        if hit is not None:
+            results[kind] = hit
+        else:
+            missing[kind] = text
+    if len(missing) == 1:
+        kind, text = next(iter(missing.items()))
+        results[kind] = await run_task(kind, text)
+    elif missing:
+        body = ''.join(f"### {kind}\n{text}\n" for kind, text in missing.items())
+        content = await complete(COMBINED_INSTRUCTION, body, sum(LLM_TASKS[k][1] for k in missing),
+                                 model=model, task='combined')
+        try:
+            data = json.loads(content) if content else {}
+        except ValueError:
+            data = {}
+        for kind, text in missing.items():
+            value = data.get(kind) if isinstance(data, dict) else None
+            if value is None:
+                results[kind] = None
+                continue
+            section = value if isinstance(value, str) and kind == 'about' else json.dumps(value)
+            results[kind] = section
+            if cache is not None:
+                await asyncio.to_thread(cache.put, cache_key(model, LLM_TASKS[kind][0], text), model, section)
+    return results
+
+class LLMBatch:
+    """Collects one brand's fallback requests for a short window and sends them as one combined call."""
+
+    def __init__(self, window: float = LLM_BATCH_WINDOW):
+        self.window = window
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.Task] = None
+
+    async def submit(self, kind: str, text: str) -> Optional[str]:
+        if kind in self._pending:
+            return await run_task(kind, text)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[kind] = (text, future)
+        if len(self._pending) == len(LLM_TASKS):
+            if self._timer is not None:
+                self._timer.cancel()
+            asyncio.ensure_future(self._flush())
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+        return await future
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        await self._flush()
+
+    async def _flush(self) -> None:
+        pending, self._pending, self._timer = self._pending, {}, None
+        if not pending:
+            return
+        try:
+            results = await run_combined({kind: text for kind, (text, _) in pending.items()})
+        except Exception:
+            logger.exception("Combined LLM fallback for %s failed", ', '.join(pending))
+            results = {}
+        for kind, (_, future) in pending.items():
+            if not future.done():
+                future.set_result(results.get(kind))
+
+def parse_json(content: Optional[str]):
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+def parse_faqs(content: Optional[str]) -> List[dict]:
+    data = parse_json(content)
+    if isinstance(data, list):
+        return [faq for faq in data if isinstance(faq, dict) and faq.get('question') and faq.get('answer')]
+    return []
+
+def parse_contact(content: Optional[str]) -> dict:
+    data = parse_json(content)
+    if not isinstance(data, dict):
+        return {"emails": [], "phones": []}
+    return {
+        "emails": data.get("emails", []),
+        "phones": data.get("phones", [])
+    }
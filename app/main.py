@@ -1,151 +1,232 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel
-from typing import Optional, List
-from app.scraper import ShopifyScraper
-from app.models import BrandInsights, Product
-from app.db import SessionLocal
-from app.schemas import Brand, BrandInsight
-import openai
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Query, Response
+from pydantic import AfterValidator, BaseModel
+from typing import Annotated, Any, Optional, List, AsyncIterator
+from app.transport import close_transport
+from app import extract, llm, metrics
+from app.models import BrandInsights
+from app.db import SessionLocal, init_db, run_db
+from app.schemas import Brand
+from app import storage
+from app.pipeline import SECTIONS, CatalogWriter, normalize_store_url, scrape_insights, scrape_insights_within, persist_insights, recent_insights, stored_payload
+from app.jobs import job_queue, get_job
+from app import bulk
+import asyncio
+import logging
 import os
 import re
 import json
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic_core import to_json
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from dotenv import load_dotenv
-load_dotenv()
 
-app = FastAPI()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# Outbound requests are counted in /metrics; httpx's per-request lines only add noise
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+COMPETITOR_CONCURRENCY = int(os.getenv("COMPETITOR_CONCURRENCY", "3"))
+COMPETITOR_DEADLINE = float(os.getenv("COMPETITOR_DEADLINE", "30"))
+COMPETITOR_MAX_AGE = float(os.getenv("COMPETITOR_MAX_AGE", str(24 * 3600)))
+INSIGHTS_MAX_AGE = float(os.getenv("INSIGHTS_MAX_AGE", "3600"))
+INSIGHTS_STALE_WHILE_REVALIDATE = float(os.getenv("INSIGHTS_STALE_WHILE_REVALIDATE", str(24 * 3600)))
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "250"))
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(init_db)
+    await asyncio.to_thread(extract.start_pool)
+    if extract.EXTRACT_WORKERS <= 0:
+        # In the background, so neither startup nor the first scrape waits on the parser imports
+        asyncio.get_running_loop().run_in_executor(None, extract.preload)
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await bulk.cancel_background_runs()
+    await close_transport()
+    await asyncio.to_thread(extract.shutdown_pool)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+class RawJSONResponse(JSONResponse):
+    # For content that is already plain JSON data, such as insights read from the database: it skips
+    # jsonable_encoder and response-model validation. orjson when installed, pydantic's serializer otherwise.
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content) if orjson is not None else to_json(content)
+
+# Requests key brands, jobs and cached records on the same URL form as bulk runs
+StoreURL = Annotated[str, AfterValidator(normalize_store_url)]
 
 class FetchInsightsRequest(BaseModel):
-    website_url: str
+    website_url: StoreURL
+    async_mode: bool = False
+    max_age: Optional[float] = None  # seconds; defaults to INSIGHTS_MAX_AGE
+    # seconds past max_age a stored record is still served while it is refreshed in the background; defaults to
+    # INSIGHTS_STALE_WHILE_REVALIDATE with the default max_age and to 0 when the caller sets max_age
+    max_stale: Optional[float] = None
+    force_refresh: bool = False
+    include_timings: bool = False  # adds an X-Scrape-Timings header with the per-stage breakdown
 
 class CompetitorInsightsRequest(BaseModel):
-    website_url: str
+    website_url: StoreURL
+
+class BulkIngestRequest(BaseModel):
+    website_urls: List[str]
 
 @app.post("/fetch-insights", response_model=BrandInsights)
-def fetch_insights(request: FetchInsightsRequest):
-    scraper = ShopifyScraper(request.website_url)
-    raw_products = scraper.get_product_catalog()
-    if not raw_products:
+async def fetch_insights(request: FetchInsightsRequest, response: Response):
+    if not request.force_refresh:
+        stored = await run_db(stored_payload, request.website_url)
+        if stored is not None and stored[1] is not None:
+            data, age = stored
+            max_age = INSIGHTS_MAX_AGE if request.max_age is None else request.max_age
+            max_stale = request.max_stale
+            if max_stale is None:
+                max_stale = INSIGHTS_STALE_WHILE_REVALIDATE if request.max_age is None else 0
+            if age <= max_age:
+                return RawJSONResponse(data, headers={"Age": str(int(age)), "X-Cache": "HIT"})
+            if age <= max_age + max_stale:
+                # Serve the stored record now and refresh it through the job queue, which joins duplicate refreshes
+                await job_queue.submit(request.website_url)
+                return RawJSONResponse(data, headers={"Age": str(int(age)), "X-Cache": "STALE"})
+            response.headers["Age"] = str(int(age))
+    if request.async_mode:
+        job = await job_queue.submit(request.website_url)
+        return JSONResponse(status_code=202, content=jsonable_encoder(job))
+    report = metrics.Breakdown()
+    metrics.breakdown.set(report)
+    catalog = CatalogWriter(request.website_url)
+    insights_obj = await scrape_insights(request.website_url, catalog=catalog)
+    if not catalog.count:
         raise HTTPException(status_code=401, detail="Website not found or no products available.")
-    products = []
-    for p in raw_products:
-        products.append(Product(
-            title=p.get('title', ''),
-            url=f"{request.website_url.rstrip('/')}/products/{p.get('handle', '')}",
-            price=float(p['variants'][0]['price']) if p.get('variants') and p['variants'][0].get('price') else None,
-            image=p['images'][0]['src'] if p.get('images') and len(p['images']) > 0 else None
-        ))
-    raw_hero_products = scraper.get_hero_products()
-    hero_products = []
-    for hp in raw_hero_products:
-        hero_products.append(Product(
-            title=hp.get('title', ''),
-            url=hp.get('url', ''),
-            price=None,
-            image=hp.get('image', None)
-        ))
-    privacy_policy = scraper.get_privacy_policy()
-    refund_policy = scraper.get_refund_policy()
-    faqs = scraper.get_faqs()
-    social_handles = scraper.get_social_handles()
-    contact_details = scraper.get_contact_details()
-    about = scraper.get_about()
-    important_links = scraper.get_important_links()
-    insights_obj = BrandInsights(
-        product_catalog=products,
-        hero_products=hero_products,
-        privacy_policy=privacy_policy,
-        refund_policy=refund_policy,
-        faqs=faqs,
-        social_handles=social_handles,
-        contact_details=contact_details,
-        about=about,
-        important_links=important_links
-    )
     # Save to DB
-    db: Session = SessionLocal()
+    await persist_insights(request.website_url, insights_obj, catalog)
+    response.headers["X-Cache"] = "MISS"
+    response.headers["Server-Timing"] = report.server_timing()
+    if request.include_timings:
+        response.headers["X-Scrape-Timings"] = json.dumps(report.as_dict())
+    return insights_obj
+
+def stream_event(event: str, payload: dict, sse: bool) -> str:
+    # Section values can hold thousands of Product models; pydantic serializes them without a dict pass
+    data = to_json({"event": event, **payload}).decode()
+    return f"event: {event}\ndata: {data}\n\n" if sse else data + "\n"
+
+async def stream_insights(website_url: str, sse: bool) -> AsyncIterator[str]:
+    # Each section is sent as soon as its extractor finishes; the full record is saved once all are in
+    sections: asyncio.Queue = asyncio.Queue()
+
+    async def on_section(name, value) -> None:
+        await sections.put((name, value))
+
+    report = metrics.Breakdown()
+    metrics.breakdown.set(report)
+    catalog = CatalogWriter(website_url)
+    scrape = asyncio.ensure_future(scrape_insights(website_url, on_section, catalog))
+    getter = None
     try:
-        brand = db.query(Brand).filter(Brand.website_url == request.website_url).first()
-        if not brand:
-            brand = Brand(website_url=request.website_url)
-            db.add(brand)
-            db.commit()
-            db.refresh(brand)
-        # Save or update BrandInsight
-        insights_json = json.dumps(insights_obj.dict())
-        brand_insight = db.query(BrandInsight).filter(BrandInsight.brand_id == brand.id).first()
-        if not brand_insight:
-            brand_insight = BrandInsight(brand_id=brand.id, insights_json=insights_json)
-            db.add(brand_insight)
-        else:
-            brand_insight.insights_json = insights_json
-        db.commit()
-    except SQLAlchemyError as e:
-        db.rollback()
-        print(f"DB ERROR: {e}")
+        sent = 0
+        while sent < len(SECTIONS):
+            # A failed extractor never sends its section, so the scrape itself is watched too
+            getter = asyncio.ensure_future(sections.get())
+            done, _ = await asyncio.wait({getter, scrape}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            name, value = getter.result()
+            sent += 1
+            yield stream_event("section", {"section": name, "data": value}, sse)
+        if scrape.done() and scrape.exception() is not None:
+            logger.error("Streaming scrape failed for %s", website_url, exc_info=scrape.exception())
+            yield stream_event("error", {"status_code": 500, "detail": f"Scrape failed: {scrape.exception()}"}, sse)
+            return
+        while not sections.empty():
+            name, value = sections.get_nowait()
+            yield stream_event("section", {"section": name, "data": value}, sse)
+        insights_obj = await scrape
+        if not catalog.count:
+            yield stream_event("error", {"status_code": 401, "detail": "Website not found or no products available."}, sse)
+            return
+        brand_id = await persist_insights(website_url, insights_obj, catalog)
+        yield stream_event("done", {"brand_id": brand_id, "timings": report.as_dict()}, sse)
     finally:
-        db.close()
-    return insights_obj
+        # A client that disconnects early stops the scrape
+        scrape.cancel()
+        if getter is not None:
+            getter.cancel()
+
+@app.post("/fetch-insights/stream")
+async def fetch_insights_stream(request: FetchInsightsRequest, http_request: Request):
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(stream_insights(request.website_url, sse), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def competitor_insights_for(url: str, semaphore: asyncio.Semaphore) -> BrandInsights:
+    cached = await run_db(recent_insights, url, COMPETITOR_MAX_AGE)
+    if cached is not None:
+        return cached
+    catalog = CatalogWriter(url)
+    async with semaphore:
+        insights, complete = await scrape_insights_within(url, COMPETITOR_DEADLINE, catalog=catalog)
+    # A brand that ran out of time still returns its finished sections, but only full scrapes are stored
+    if complete and catalog.count:
+        await persist_insights(url, insights, catalog)
+    return insights
 
 @app.post("/fetch-competitors", response_model=List[BrandInsights])
-def fetch_competitors(request: CompetitorInsightsRequest):
+async def fetch_competitors(request: CompetitorInsightsRequest):
     try:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        prompt = (
-            f"List 5 direct competitor Shopify store URLs for the brand at {request.website_url}. "
-            "Return only the URLs, one per line."
-        )
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
+        response = await llm.get_client().chat.completions.create(
+            model=llm.LLM_MODEL,
+            messages=[{"role": "user", "content": (
+                f"List 5 direct competitor Shopify store URLs for the brand at {request.website_url}. "
+                "Return only the URLs, one per line."
+            )}],
             max_tokens=256,
             temperature=0
         )
         content = response.choices[0].message.content
-        urls = re.findall(r'https?://[\w\.-]+', content)
-        print("Competitor URLs:", urls)
+        urls = re.findall(r'https?://[\w\.-]+(?::\d+)?', content)
+        logger.info("Competitor URLs for %s: %s", request.website_url, urls)
+        semaphore = asyncio.Semaphore(COMPETITOR_CONCURRENCY)
+        results = await asyncio.gather(*(competitor_insights_for(url, semaphore) for url in urls),
+                                       return_exceptions=True)
         competitor_insights = []
-        for url in urls:
-            try:
-                scraper = ShopifyScraper(url)
-                raw_products = scraper.get_product_catalog()
-                products = []
-                for p in raw_products:
-                    products.append(Product(
-                        title=p.get('title', ''),
-                        url=f"{url.rstrip('/')}/products/{p.get('handle', '')}",
-                        price=float(p['variants'][0]['price']) if p.get('variants') and p['variants'][0].get('price') else None,
-                        image=p['images'][0]['src'] if p.get('images') and len(p['images']) > 0 else None
-                    ))
-                hero_products = [Product(
-                    title=hp.get('title', ''),
-                    url=hp.get('url', ''),
-                    price=None,
-                    image=hp.get('image', None)
-                ) for hp in scraper.get_hero_products()]
-                insights = BrandInsights(
-                    product_catalog=products,
-                    hero_products=hero_products,
-                    privacy_policy=scraper.get_privacy_policy(),
-                    refund_policy=scraper.get_refund_policy(),
-                    faqs=scraper.get_faqs(),
-                    social_handles=scraper.get_social_handles(),
-                    contact_details=scraper.get_contact_details(),
-                    about=scraper.get_about(),
-                    important_links=scraper.get_important_links()
-                )
-                competitor_insights.append(insights)
-            except Exception as e:
-                print(f"Error scraping competitor {url}: {e}")
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logger.warning("Error scraping competitor %s: %s", url, result)
                 continue
+            competitor_insights.append(result)
         if not competitor_insights:
             raise HTTPException(status_code=404, detail="No competitor insights found.")
         return competitor_insights
     except Exception as e:
-        print(f"COMPETITOR ENDPOINT ERROR: {e}")
+        logger.exception("Competitor analysis failed for %s", request.website_url)
         raise HTTPException(status_code=500, detail=f"Competitor analysis failed: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await run_in_threadpool(get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 def get_db():
     db = SessionLocal()
     try:
@@ -154,17 +235,79 @@ def get_db():
         db.close()
 
 @app.get("/brands")
-def list_brands(db: Session = Depends(get_db)):
-    brands = db.query(Brand).all()
-    return [{"id": b.id, "website_url": b.website_url, "created_at": b.created_at} for b in brands]
+def list_brands(response: Response, after: Optional[int] = None, limit: int = Query(100, ge=1, le=1000),
+                q: Optional[str] = None, scraped_since: Optional[datetime] = None, db: Session = Depends(get_db)):
+    brands = storage.list_brands(db, after=after, limit=limit + 1, q=q, scraped_since=scraped_since)
+    if len(brands) > limit:
+        brands = brands[:limit]
+        response.headers["X-Next-Cursor"] = str(brands[-1]["id"])
+    return brands
 
 @app.get("/brands/{brand_id}/insights")
-def get_brand_insights(brand_id: int, db: Session = Depends(get_db)):
+def get_brand_insights(brand_id: int, fields: Optional[str] = None, sections: Optional[str] = None,
+                       catalog_after: int = Query(-1, ge=-1), catalog_limit: int = Query(CATALOG_PAGE_SIZE, ge=1, le=5000),
+                       db: Session = Depends(get_db)):
     brand = db.query(Brand).filter(Brand.id == brand_id).first()
     if not brand:
         raise HTTPException(status_code=404, detail="Brand not found")
-    insight = db.query(BrandInsight).filter(BrandInsight.brand_id == brand_id).first()
-    if not insight:
+    requested = None
+    selection = fields or sections
+    if selection:
+        requested = [s.strip() for s in selection.split(',') if s.strip()]
+        unknown = [s for s in requested if s not in storage.SECTION_NAMES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # The catalog is served a page at a time; catalog_after is the position of the last product already seen
+    start = catalog_after + 1
+    insights = storage.load_insights(db, brand, requested, catalog_range=(start, start + catalog_limit + 1))
+    if insights is None:
         raise HTTPException(status_code=404, detail="No insights found for this brand")
-    import json
-    return json.loads(insight.insights_json) 
\ No newline at end of file
+    headers = {}
+    catalog = insights.get('product_catalog')
+    if catalog is not None and len(catalog) > catalog_limit:
+        insights['product_catalog'] = catalog[:catalog_limit]
+        headers["X-Catalog-Next-Cursor"] = str(start + catalog_limit - 1)
+    return RawJSONResponse(insights, headers=headers)
+
+@app.get("/changes")
+def list_changes(since: datetime, brand_id: Optional[int] = None, section: Optional[str] = None,
+                 limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db)):
+    return storage.changes_since(db, since, brand_id=brand_id, section=section, limit=limit)
+
+@app.get("/brands/{brand_id}/changes")
+def list_brand_changes(brand_id: int, since: datetime, section: Optional[str] = None,
+                       limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db)):
+    if not db.query(Brand.id).filter(Brand.id == brand_id).first():
+        raise HTTPException(status_code=404, detail="Brand not found")
+    return storage.changes_since(db, since, brand_id=brand_id, section=section, limit=limit)
+
+@app.get("/products")
+def search_products(q: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                    brand_id: Optional[int] = None, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0),
+                    db: Session = Depends(get_db)):
+    return storage.search_products(db, q=q, min_price=min_price, max_price=max_price, brand_id=brand_id,
+                                   limit=limit, offset=offset)
+
+@app.post("/bulk-ingest", status_code=202)
+async def bulk_ingest(request: BulkIngestRequest):
+    if not request.website_urls:
+        raise HTTPException(status_code=400, detail="No website URLs given.")
+    run_id = await run_in_threadpool(bulk.create_run, request.website_urls)
+    bulk.start_background_run(run_id)
+    return await run_in_threadpool(bulk.run_summary, run_id)
+
+@app.post("/bulk-ingest/{run_id}/resume", status_code=202)
+async def resume_bulk_ingest(run_id: str):
+    summary = await run_in_threadpool(bulk.run_summary, run_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    if not bulk.is_running(run_id):
+        bulk.start_background_run(run_id)
+    return summary
+
+@app.get("/bulk-ingest/{run_id}")
+async def get_bulk_ingest(run_id: str):
+    summary = await run_in_threadpool(bulk.run_summary, run_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    return summary
@@ -0,0 +1,136 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Upper bounds in seconds, shared by every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_histograms: Dict[str, Dict[LabelKey, List[float]]] = {}  # bucket counts, then sum, then count
+_help: Dict[str, str] = {}
+
+# The scrape stage (discovery, catalog, hero, policy, faqs, contact, about, links) the current task works for
+stage: contextvars.ContextVar[str] = contextvars.ContextVar("stage", default="other")
+# Per-scrape breakdown collected alongside the global metrics when a caller asks for one
+breakdown: contextvars.ContextVar[Optional["Breakdown"]] = contextvars.ContextVar("breakdown", default=None)
+
+class Breakdown:
+    """Timings and request counts for a single scrape, for a response-level report."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections: Dict[str, float] = {}  # extractor wall time in seconds
+        self.stages: Dict[str, Dict[str, float]] = {}  # requests, bytes, llm_calls, llm_seconds per stage
+
+    def add(self, stage_name: str, **values: float) -> None:
+        totals = self.stages.setdefault(stage_name, {})
+        for key, value in values.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.sections.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ', '.join(entries)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "sections": {name: round(seconds, 4) for name, seconds in self.sections.items()},
+            "stages": {name: {k: round(v, 4) for k, v in totals.items()} for name, totals in self.stages.items()},
+        }
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def describe(name: str, text: str) -> None:
+    _help[name] = text
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    with _lock:
+        series = _counters.setdefault(name, {})
+        key = _key(labels)
+        series[key] = series.get(key, 0) + value
+
+def observe(name: str, value: float, **labels) -> None:
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        key = _key(labels)
+        data = series.get(key)
+        if data is None:
+            data = series[key] = [0.0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += value
+        data[-1] += 1
+
+@contextmanager
+def timer(name: str, **labels) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def record_stage(stage_name: str, **values: float) -> None:
+    current = breakdown.get()
+    if current is not None:
+        current.add(stage_name, **values)
+
+def snapshot() -> Dict[str, Dict[LabelKey, float]]:
+    with _lock:
+        return {name: dict(series) for name, series in _counters.items()}
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def _labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def render_prometheus() -> str:
+    # Prometheus text exposition format, version 0.0.4
+    lines = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_labels(key)} {value:g}")
+        for name, series in sorted(_histograms.items()):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, data in series.items():
+                for bound, count in zip(BUCKETS, data):
+                    lines.append(f"{name}_bucket{_labels(key, (('le', f'{bound:g}'),))} {count:g}")
+                lines.append(f"{name}_bucket{_labels(key, (('le', '+Inf'),))} {data[-1]:g}")
+                lines.append(f"{name}_sum{_labels(key)} {data[-2]:.6f}")
+                lines.append(f"{name}_count{_labels(key)} {data[-1]:g}")
+    return '\n'.join(lines) + '\n'
+
+describe("http_requests_total", "Outbound HTTP requests by stage, status and cache outcome.")
+describe("http_request_seconds", "Outbound HTTP request latency including retries.")
+describe("http_response_bytes_total", "Decoded bytes of outbound HTTP responses.")
+describe("http_retries_total", "Outbound HTTP retries by reason.")
+describe("llm_requests_total", "LLM completions by task and cache outcome.")
+describe("llm_input_tokens_total", "Estimated prompt tokens sent to the LLM.")
+describe("llm_request_seconds", "LLM completion latency for cache misses.")
+describe("llm_errors_total", "Failed LLM completions.")
+describe("scrape_stage_seconds", "Time for each extractor of a scrape.")
+describe("catalog_truncated_total", "Catalogs cut off at SCRAPER_MAX_CATALOG_PAGES.")
+describe("scrape_stage_errors_total", "Extractor failures swallowed during a scrape.")
+describe("scrape_seconds", "Time for a whole brand scrape.")
+describe("extract_seconds", "Page parsing and extraction time, including the wait for a worker process.")
+describe("discovery_profile_lookups_total", "Saved discovery profile URLs tried, by section and whether they still worked.")
@@ -1,11 +1,23 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 
+class ProductVariant(BaseModel):
+    title: Optional[str] = None
+    sku: Optional[str] = None
+    price: Optional[float] = None
+    compare_at_price: Optional[float] = None
+    available: Optional[bool] = None
+
 class Product(BaseModel):
     title: str
     url: str
     price: Optional[float]
     image: Optional[str]
+    handle: Optional[str] = None
+    vendor: Optional[str] = None
+    product_type: Optional[str] = None
+    tags: List[str] = []
+    variants: List[ProductVariant] = []
 
 class BrandInsights(BaseModel):
     product_catalog: List[Product]
@@ -16,4 +28,4 @@ class BrandInsights(BaseModel):
     social_handles: Dict = {}
     contact_details: Dict = {}
     about: Optional[str] = None
-    important_links: Dict = {} 
\ No newline at end of file
+    important_links: Dict = {}
@@ -0,0 +1,244 @@
+import importlib.util
+import io
+import os
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, Iterator, List, Sequence, Tuple
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+def _default_parser() -> str:
+    # find_spec checks lxml is installed without importing it at startup
+    return 'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser'
+
+# Any BeautifulSoup tree builder name works here: lxml, html5lib, html.parser
+HTML_PARSER = os.getenv("HTML_PARSER") or _default_parser()
+
+SOCIAL_DOMAINS = {
+    'instagram': 'instagram.com',
+    'facebook': 'facebook.com',
+    'tiktok': 'tiktok.com',
+    'twitter': 'twitter.com',
+    'youtube': 'youtube.com',
+    'pinterest': 'pinterest.com',
+    'linkedin': 'linkedin.com',
+    'snapchat': 'snapchat.com',
+    'whatsapp': 'wa.me',
+    'telegram': 't.me',
+}
+
+IMPORTANT_LINK_KEYWORDS = {
+    'order_tracking': ['track', 'tracking', 'order status'],
+    'contact_us': ['contact'],
+    'blog': ['blog'],
+    'support': ['support', 'help'],
+    'returns': ['return', 'refund', 'exchange'],
+    'policy': ['policy'],
+    'faq': ['faq', 'questions']
+}
+
+POLICY_KEYWORDS = {
+    'privacy': ['privacy'],
+    'refund': ['refund', 'return', 'exchange'],
+}
+
+CONTACT_KEYWORDS = ['contact', 'support', 'customer-service']
+ABOUT_KEYWORDS = ['about', 'story']
+
+# Relevance weights for FAQ page discovery, matched against the URL path and the anchor text
+FAQ_URL_WEIGHTS = {'faq': 10, 'question': 6, 'help': 4, 'support': 3, 'customer-service': 3, 'customer-care': 3}
+FAQ_TEXT_WEIGHTS = {'faq': 8, 'frequently asked': 8, 'question': 5, 'help': 3, 'support': 2}
+# Catalog, cart and account pages are never FAQ pages
+FAQ_EXCLUDED_PATHS = ('/products/', '/collections', '/cart', '/account', '/search', '/checkout', '/cdn/')
+
+class KeywordMatcher:
+    """Finds which labels have a keyword in a string, with one scan of a precompiled regex."""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        labels: Dict[str, set] = {}
+        for label, kw_list in keywords.items():
+            for kw in kw_list:
+                labels.setdefault(kw, set()).add(label)
+        # Only the longest keyword starting at a position matches, so each keyword also carries
+        # the labels of the keywords inside it
+        self._labels = {kw: frozenset().union(*(ls for other, ls in labels.items() if other in kw)) for kw in labels}
+        alternation = '|'.join(re.escape(kw) for kw in sorted(labels, key=len, reverse=True))
+        # The leading class lets the scan skip positions that cannot start any keyword
+        first = ''.join(sorted({re.escape(kw[0]) for kw in labels}))
+        self._pattern = re.compile(f'(?=[{first}])(?=({alternation}))')
+
+    def labels(self, text: str) -> FrozenSet[str]:
+        found: FrozenSet[str] = frozenset()
+        for match in self._pattern.finditer(text):
+            found = found | self._labels[match.group(1)]
+        return found
+
+    def labels_each(self, texts: Sequence[str]) -> List[FrozenSet[str]]:
+        # One scan over the distinct strings joined together; keywords never contain NUL, so no match
+        # crosses from one string into the next
+        distinct = list(dict.fromkeys(texts))
+        ends = list(accumulate(len(text) + 1 for text in distinct))
+        found: List[FrozenSet[str]] = [frozenset()] * len(distinct)
+        for match in self._pattern.finditer('\0'.join(distinct)):
+            i = bisect_right(ends, match.start())
+            found[i] = found[i] | self._labels[match.group(1)]
+        by_text = dict(zip(distinct, found))
+        return [by_text[text] for text in texts]
+
+# Every keyword list a homepage link is checked against, as one matcher
+LINK_MATCHER = KeywordMatcher({
+    **{f'social:{platform}': [domain] for platform, domain in SOCIAL_DOMAINS.items()},
+    **{f'important:{key}': kw_list for key, kw_list in IMPORTANT_LINK_KEYWORDS.items()},
+    **{f'policy:{policy}': kw_list for policy, kw_list in POLICY_KEYWORDS.items()},
+    'contact': CONTACT_KEYWORDS,
+    'about': ABOUT_KEYWORDS,
+})
+FAQ_URL_MATCHER = KeywordMatcher({kw: [kw] for kw in FAQ_URL_WEIGHTS})
+FAQ_TEXT_MATCHER = KeywordMatcher({kw: [kw] for kw in FAQ_TEXT_WEIGHTS})
+
+# Sections of the URL index built from a store's sitemap
+URL_INDEX_SECTIONS = ('privacy', 'refund', 'faq', 'about', 'contact', 'product')
+# Child sitemaps that list content pages; product, collection and blog sitemaps are not needed for discovery
+SITEMAP_CHILD_KEYWORDS = ('pages', 'policies')
+
+def make_soup(html: str, parser: str = None) -> "BeautifulSoup":
+    # bs4 is imported on the first parse, not when the app starts
+    from bs4 import BeautifulSoup, FeatureNotFound
+    try:
+        return BeautifulSoup(html, parser or HTML_PARSER)
+    except FeatureNotFound:
+        return BeautifulSoup(html, 'html.parser')
+
+def absolute_url(base_url: str, href: str) -> str:
+    return href if href.startswith('http') else f"{base_url}{href if href.startswith('/') else '/' + href}"
+
+def classify_links(soup: "BeautifulSoup", base_url: str) -> Dict[str, Any]:
+    # One walk over the homepage anchors feeds every link-based extractor
+    hero_products: List[Dict[str, Any]] = []
+    seen_products = set()
+    social_handles: Dict[str, str] = {}
+    important_links: Dict[str, str] = {}
+    policy_links: Dict[str, List[str]] = {policy: [] for policy in POLICY_KEYWORDS}
+    anchors: List[Tuple[str, str]] = []
+    contact_url = None
+    about_url = None
+    links = [(a, a['href'], a.get_text(strip=True)) for a in soup.find_all('a', href=True)]
+    # Hrefs and anchor texts alternate, so link i has labels 2i and 2i + 1
+    labels = LINK_MATCHER.labels_each([part.lower() for _, href, text in links for part in (href, text)])
+    for i, (a, href, text) in enumerate(links):
+        href_lower = href.lower()
+        text_lower = text.lower()
+        anchors.append((absolute_url(base_url, href), text_lower))
+        href_labels = labels[2 * i]
+        text_labels = labels[2 * i + 1]
+        if '/products/' in href:
+            product_url = absolute_url(base_url, href)
+            if text and product_url not in seen_products:
+                img = a.find('img')
+                hero_products.append({
+                    'title': text,
+                    'url': product_url,
+                    'image': img['src'] if img and img.has_attr('src') else None
+                })
+                seen_products.add(product_url)
+        if not href_labels and not text_labels:
+            continue
+        for platform in SOCIAL_DOMAINS:
+            if f'social:{platform}' in href_labels:
+                social_handles[platform] = href
+        for key in IMPORTANT_LINK_KEYWORDS:
+            label = f'important:{key}'
+            if key not in important_links and (label in href_labels or label in text_labels):
+                important_links[key] = absolute_url(base_url, href)
+        for policy in POLICY_KEYWORDS:
+            if f'policy:{policy}' in href_labels:
+                policy_links[policy].append(absolute_url(base_url, href_lower))
+        if contact_url is None and 'contact' in href_labels:
+            contact_url = absolute_url(base_url, href_lower)
+        if about_url is None and 'about' in href_labels:
+            about_url = absolute_url(base_url, href_lower)
+    return {
+        'hero_products': hero_products,
+        'social_handles': social_handles,
+        'important_links': important_links,
+        'policy_links': policy_links,
+        'anchors': anchors,
+        'contact_url': contact_url,
+        'about_url': about_url,
+    }
+
+def rank_faq_candidates(anchors: Iterable[Tuple[str, str]], base_url: str,
+                        exclude: Iterable[str] = ()) -> List[str]:
+    # Same-site links only, best score first, homepage order breaking ties
+    host = urlsplit(base_url).netloc.lower().removeprefix('www.')
+    skip = {url.rstrip('/') for url in exclude}
+    scores: Dict[str, int] = {}
+    for url, text in anchors:
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or parts.netloc.lower().removeprefix('www.') != host:
+            continue
+        path = parts.path.lower()
+        key = url.split('#')[0].rstrip('/')
+        if key in skip or not path.strip('/') or any(p in path for p in FAQ_EXCLUDED_PATHS):
+            continue
+        score = sum(FAQ_URL_WEIGHTS[kw] for kw in FAQ_URL_MATCHER.labels(path))
+        score += sum(FAQ_TEXT_WEIGHTS[kw] for kw in FAQ_TEXT_MATCHER.labels(text))
+        if score > scores.get(key, 0):
+            scores[key] = score
+    return sorted(scores, key=lambda url: -scores[url])
+
+def same_site_url(base_url: str, url: str) -> str:
+    # Sitemaps name the store's primary domain; requests stay on the host the scrape started with
+    parts = urlsplit(url)
+    return f"{base_url}{parts.path.rstrip('/')}" + (f"?{parts.query}" if parts.query else '')
+
+def iter_sitemap_locs(content: bytes) -> Iterator[Tuple[str, str]]:
+    # Streams (kind, loc) pairs out of a sitemap index ('sitemap') or URL set ('url'),
+    # clearing each entry once read so large sitemaps are never held as a whole tree
+    entry = None
+    for event, elem in ElementTree.iterparse(io.BytesIO(content), events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if tag in ('sitemap', 'url'):
+                entry = tag
+        elif tag == 'loc' and entry and elem.text:
+            yield entry, elem.text.strip()
+        elif tag in ('sitemap', 'url'):
+            elem.clear()
+            entry = None
+
+def is_content_sitemap(url: str) -> bool:
+    return any(kw in urlsplit(url).path.lower() for kw in SITEMAP_CHILD_KEYWORDS)
+
+def classify_sitemap_urls(urls: Iterable[str], base_url: str) -> Dict[str, List[str]]:
+    # Sorts sitemap URLs into the pages each extractor looks for, in sitemap order (FAQ pages best first)
+    index: Dict[str, List[str]] = {section: [] for section in URL_INDEX_SECTIONS}
+    pages = []
+    for url in urls:
+        url = same_site_url(base_url, url)
+        path = urlsplit(url).path.lower()
+        if not path.strip('/'):
+            continue
+        if '/products/' in path:
+            index['product'].append(url)
+            continue
+        if path.startswith('/blogs/') or any(p in path for p in FAQ_EXCLUDED_PATHS):
+            continue
+        pages.append((url, ''))
+        labels = LINK_MATCHER.labels(path)
+        for policy in POLICY_KEYWORDS:
+            if f'policy:{policy}' in labels:
+                index[policy].append(url)
+        if 'contact' in labels:
+            index['contact'].append(url)
+        if 'about' in labels:
+            index['about'].append(url)
+    index['faq'] = rank_faq_candidates(pages, base_url)
+    for policy in POLICY_KEYWORDS:
+        # Shopify's own policy pages before store-made lookalikes
+        index[policy].sort(key=lambda url: '/policies/' not in url)
+    return index
@@ -0,0 +1,352 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import metrics
+from app.scraper import PRODUCTS_PAGE_LIMIT, ShopifyScraper
+from app.models import BrandInsights, Product, ProductVariant
+from app.db import run_db
+from app.schemas import Brand, BrandInsight, DiscoveryProfile
+from app.storage import load_insights, write_catalog_page, write_insights
+
+logger = logging.getLogger(__name__)
+
+# Seconds a host's discovery profile is trusted before the next scrape rediscovers every page; 0 turns profiles off
+DISCOVERY_PROFILE_TTL = float(os.getenv("DISCOVERY_PROFILE_TTL", str(7 * 24 * 3600)))
+
+SectionCallback = Callable[[str, Any], Awaitable[None]]
+
+def to_price(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def build_variants(raw_variants: List[dict]) -> List[ProductVariant]:
+    return [ProductVariant(
+        title=v.get('title'),
+        sku=v.get('sku') or None,
+        price=to_price(v.get('price')),
+        compare_at_price=to_price(v.get('compare_at_price')),
+        available=v.get('available')
+    ) for v in raw_variants]
+
+def build_products(raw_products: List[dict], website_url: str) -> List[Product]:
+    products = []
+    for p in raw_products:
+        tags = p.get('tags') or []
+        if isinstance(tags, str):
+            tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+        products.append(Product(
+            title=p.get('title', ''),
+            url=f"{website_url.rstrip('/')}/products/{p.get('handle', '')}",
+            price=to_price(p['variants'][0].get('price')) if p.get('variants') else None,
+            image=p['images'][0]['src'] if p.get('images') and len(p['images']) > 0 else None,
+            handle=p.get('handle') or None,
+            vendor=p.get('vendor') or None,
+            product_type=p.get('product_type') or None,
+            tags=tags,
+            variants=build_variants(p.get('variants') or [])
+        ))
+    return products
+
+class CatalogWriter:
+    # Saves a catalog to the database page by page while it is scraped. Only a writer that keeps the
+    # products, for a response that returns them, holds the whole catalog in memory.
+    def __init__(self, website_url: str, keep: bool = True):
+        self.website_url = website_url
+        self.keep = keep
+        self.token = uuid.uuid4().hex
+        self.products: List[Product] = []
+        self.count = 0
+        self.version: Optional[int] = None
+        self.complete = False
+        self.failed = False
+
+    async def add(self, products: List[Product]) -> None:
+        start = self.count
+        self.count += len(products)
+        if self.keep:
+            self.products.extend(products)
+        if self.failed or not products:
+            return
+        try:
+            self.version = await run_db(save_catalog_page, self.website_url, self.token, start, products,
+                                        self.version, write=True)
+        except SQLAlchemyError:
+            # Later pages are not written either; without every page, unseen products cannot be told apart
+            logger.exception("Could not save catalog page at %d for %s", start, self.website_url)
+            self.failed = True
+
+def save_catalog_page(db: Session, website_url: str, token: str, start: int, products: List[Product],
+                      version: Optional[int]) -> Optional[int]:
+    return write_catalog_page(db, get_or_create_brand(db, website_url), token, start, products, version)
+
+async def build_catalog(scraper: ShopifyScraper, website_url: str, catalog: Optional[CatalogWriter] = None) -> List[Product]:
+    # With a writer each page is saved as it arrives; without one the catalog is collected and saved as a whole
+    products = []
+    async for raw_page in scraper.iter_product_pages():
+        page = build_products(raw_page, website_url)
+        if catalog is None:
+            products.extend(page)
+        else:
+            await catalog.add(page)
+    if catalog is None:
+        return products
+    catalog.complete = True
+    return catalog.products
+
+async def build_hero_products(scraper: ShopifyScraper) -> List[Product]:
+    hero_products = []
+    for hp in await scraper.get_hero_products():
+        hero_products.append(Product(
+            title=hp.get('title', ''),
+            url=hp.get('url', ''),
+            price=None,
+            image=hp.get('image', None)
+        ))
+    return hero_products
+
+def section_extractors(scraper: ShopifyScraper, website_url: str,
+                       catalog: Optional[CatalogWriter] = None) -> Dict[str, Awaitable[Any]]:
+    # One awaitable per BrandInsights field, in field order
+    return {
+        'product_catalog': build_catalog(scraper, website_url, catalog),
+        'hero_products': build_hero_products(scraper),
+        'privacy_policy': scraper.get_privacy_policy(),
+        'refund_policy': scraper.get_refund_policy(),
+        'faqs': scraper.get_faqs(),
+        'social_handles': scraper.get_social_handles(),
+        'contact_details': scraper.get_contact_details(),
+        'about': scraper.get_about(),
+        'important_links': scraper.get_important_links(),
+    }
+
+SECTIONS = ['product_catalog', 'hero_products', 'privacy_policy', 'refund_policy', 'faqs',
+            'social_handles', 'contact_details', 'about', 'important_links']
+
+# Metric stage tag for the requests each extractor makes
+SECTION_STAGES = {
+    'product_catalog': 'catalog',
+    'hero_products': 'hero',
+    'privacy_policy': 'policy',
+    'refund_policy': 'policy',
+    'faqs': 'faqs',
+    'social_handles': 'links',
+    'contact_details': 'contact',
+    'about': 'about',
+    'important_links': 'links',
+}
+
+async def scrape_sections(website_url: str, on_section: Optional[SectionCallback] = None,
+                          results: Optional[Dict[str, Any]] = None,
+                          catalog: Optional[CatalogWriter] = None) -> Dict[str, Any]:
+    # Runs every extractor at once; on_section(name, value) fires as each one finishes.
+    # Finished sections land in `results` as they complete, so callers can keep them after a cancel.
+    # With a catalog writer the catalog is saved page by page during the scrape.
+    profile = await load_discovery_profile(website_url)
+    scraper = ShopifyScraper(website_url, profile=profile)
+    results = {} if results is None else results
+    report = metrics.breakdown.get()
+
+    async def run(name: str, extractor: Awaitable[Any]) -> None:
+        # Each extractor runs in its own task, so the stage tag only applies to its own requests
+        metrics.stage.set(SECTION_STAGES[name])
+        start = time.perf_counter()
+        results[name] = await extractor
+        elapsed = time.perf_counter() - start
+        metrics.observe("scrape_stage_seconds", elapsed, stage=SECTION_STAGES[name], section=name)
+        if report is not None:
+            report.sections[name] = elapsed
+        if on_section is not None:
+            await on_section(name, results[name])
+
+    with metrics.timer("scrape_seconds"):
+        await asyncio.gather(*(run(name, extractor) for name, extractor in section_extractors(scraper, website_url, catalog).items()))
+    if scraper.resolved != (profile or {}):
+        await persist_discovery_profile(website_url, scraper.resolved)
+    return results
+
+async def scrape_insights(website_url: str, on_section: Optional[SectionCallback] = None,
+                          catalog: Optional[CatalogWriter] = None) -> BrandInsights:
+    return BrandInsights(**await scrape_sections(website_url, on_section, catalog=catalog))
+
+async def scrape_insights_within(website_url: str, timeout: float, on_section: Optional[SectionCallback] = None,
+                                 catalog: Optional[CatalogWriter] = None) -> Tuple[BrandInsights, bool]:
+    # Returns whatever sections finished before the deadline, and whether all of them did
+    results: Dict[str, Any] = {}
+    try:
+        await asyncio.wait_for(scrape_sections(website_url, on_section, results, catalog), timeout)
+        complete = True
+    except asyncio.TimeoutError:
+        complete = False
+    return BrandInsights(**{'product_catalog': [], **results}), complete
+
+def age_seconds(stamp: Optional[datetime]) -> Optional[float]:
+    if stamp is None:
+        return None
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - stamp).total_seconds()
+
+def brand_age_seconds(db: Session, brand: Brand) -> Optional[float]:
+    if brand.scraped_at is not None:
+        return age_seconds(brand.scraped_at)
+    insight = db.query(BrandInsight).filter(BrandInsight.brand_id == brand.id).first()
+    return age_seconds(insight.updated_at or insight.created_at) if insight else None
+
+def stored_payload(db: Session, website_url: str) -> Optional[Tuple[Dict[str, Any], Optional[float]]]:
+    # The stored record as plain data in BrandInsights' shape, ready to serialize without a model, and its age
+    brand = find_brand(db, website_url)
+    if brand is None:
+        return None
+    data = load_insights(db, brand)
+    if data is None:
+        return None
+    if brand.scraped_at is None:
+        # Legacy JSON blobs can predate newer fields; the model fills in their defaults
+        data = BrandInsights(**data).model_dump()
+    return data, brand_age_seconds(db, brand)
+
+def stored_insights(db: Session, website_url: str) -> Optional[Tuple[BrandInsights, Optional[float]]]:
+    # The stored record for a brand and its age in seconds
+    stored = stored_payload(db, website_url)
+    if stored is None:
+        return None
+    data, age = stored
+    return BrandInsights(**data), age
+
+def recent_insights(db: Session, website_url: str, max_age: float) -> Optional[BrandInsights]:
+    stored = stored_insights(db, website_url)
+    if stored is None:
+        return None
+    insights, age = stored
+    if age is None or age > max_age:
+        return None
+    return insights
+
+def normalize_store_url(url: str) -> str:
+    # One form per store, so the API, jobs and bulk runs share its brand: https:// when no scheme is given,
+    # no trailing slash
+    url = url.strip().rstrip('/')
+    if url and not url.startswith(('http://', 'https://')):
+        url = f"https://{url}"
+    return url
+
+def find_brand(db: Session, website_url: str) -> Optional[Brand]:
+    # Brands saved before URLs were normalized may still end in a slash
+    url = normalize_store_url(website_url)
+    return db.query(Brand).filter(Brand.website_url.in_([url, url + '/'])).order_by(Brand.id).first()
+
+def get_or_create_brand(db: Session, website_url: str) -> Brand:
+    brand = find_brand(db, website_url)
+    if brand is not None:
+        return brand
+    website_url = normalize_store_url(website_url)
+    dialect = db.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Concurrent writers creating the same brand both succeed instead of one hitting the unique index
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        db.execute(insert(Brand).values(website_url=website_url).on_conflict_do_nothing(index_elements=['website_url']))
+        return db.query(Brand).filter(Brand.website_url == website_url).one()
+    brand = Brand(website_url=website_url)
+    db.add(brand)
+    db.flush()
+    return brand
+
+def upsert_insights(db: Session, website_url: str, insights_obj: BrandInsights,
+                    catalog: Optional[CatalogWriter] = None) -> int:
+    # Without a writer the catalog in insights_obj is saved here, in pages of the size the scraper reads
+    brand = get_or_create_brand(db, website_url)
+    if catalog is None:
+        token, version, complete = uuid.uuid4().hex, None, True
+        products = insights_obj.product_catalog
+        for start in range(0, len(products), PRODUCTS_PAGE_LIMIT):
+            version = write_catalog_page(db, brand, token, start, products[start:start + PRODUCTS_PAGE_LIMIT], version)
+    else:
+        token, version, complete = catalog.token, catalog.version, catalog.complete
+    if brand.scraped_at is None:
+        # The legacy JSON blob is dropped once the brand is stored in the normalized tables
+        db.query(BrandInsight).filter(BrandInsight.brand_id == brand.id).delete(synchronize_session=False)
+        db.query(DiscoveryProfile).filter(DiscoveryProfile.host == profile_host(website_url),
+                                          DiscoveryProfile.brand_id.is_(None)).update({"brand_id": brand.id}, synchronize_session=False)
+    write_insights(db, brand, insights_obj, token, version, complete)
+    brand.scraped_at = func.now()
+    db.flush()
+    return brand.id
+
+async def persist_insights(website_url: str, insights_obj: BrandInsights,
+                           catalog: Optional[CatalogWriter] = None) -> Optional[int]:
+    # Brand and insights are written in a single transaction, on the async session path when DB_ASYNC is set
+    if catalog is not None and catalog.failed:
+        logger.error("Not saving insights for %s: part of its catalog could not be saved", website_url)
+        return None
+    try:
+        return await run_db(upsert_insights, website_url, insights_obj, catalog, write=True)
+    except SQLAlchemyError:
+        logger.exception("Could not save insights for %s", website_url)
+        return None
+
+def profile_host(website_url: str) -> str:
+    return urlsplit(website_url.rstrip('/')).netloc.lower()
+
+def discovery_profile(db: Session, website_url: str) -> Optional[Dict[str, str]]:
+    # Page URLs the last scrape of this host resolved, unless the profile is older than DISCOVERY_PROFILE_TTL
+    profile = db.query(DiscoveryProfile).filter(DiscoveryProfile.host == profile_host(website_url)).first()
+    if profile is None:
+        return None
+    age = age_seconds(profile.updated_at or profile.created_at)
+    if age is None or age > DISCOVERY_PROFILE_TTL:
+        return None
+    return json.loads(profile.urls)
+
+def save_discovery_profile(db: Session, website_url: str, urls: Dict[str, str]) -> None:
+    host = profile_host(website_url)
+    brand = find_brand(db, website_url)
+    brand_id = brand.id if brand is not None else None
+    values = {"host": host, "brand_id": brand_id, "urls": json.dumps(urls, sort_keys=True), "updated_at": func.now()}
+    dialect = db.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        stmt = insert(DiscoveryProfile).values(**values)
+        db.execute(stmt.on_conflict_do_update(index_elements=['host'], set_={
+            "brand_id": func.coalesce(stmt.excluded.brand_id, DiscoveryProfile.brand_id),
+            "urls": stmt.excluded.urls,
+            "updated_at": stmt.excluded.updated_at,
+        }))
+        return
+    profile = db.query(DiscoveryProfile).filter(DiscoveryProfile.host == host).first()
+    if profile is None:
+        db.add(DiscoveryProfile(**values))
+    else:
+        profile.brand_id = brand_id or profile.brand_id
+        profile.urls = values["urls"]
+        profile.updated_at = values["updated_at"]
+    db.flush()
+
+async def load_discovery_profile(website_url: str) -> Optional[Dict[str, str]]:
+    if DISCOVERY_PROFILE_TTL <= 0:
+        return None
+    try:
+        return await run_db(discovery_profile, website_url)
+    except SQLAlchemyError:
+        logger.exception("Could not load the discovery profile for %s", website_url)
+        return None
+
+async def persist_discovery_profile(website_url: str, urls: Dict[str, str]) -> None:
+    if DISCOVERY_PROFILE_TTL <= 0:
+        return
+    try:
+        await run_db(save_discovery_profile, website_url, urls, write=True)
+    except SQLAlchemyError:
+        logger.exception("Could not save the discovery profile for %s", website_url)
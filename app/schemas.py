@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, Float, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db import Base
@@ -8,6 +8,8 @@ class Brand(Base):
     id = Column(Integer, primary_key=True, index=True)
     website_url = Column(String, unique=True, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    scraped_at = Column(DateTime(timezone=True), nullable=True)  # set once insights live in the normalized tables
+    version = Column(Integer, nullable=True, default=0)  # bumped whenever a scrape records changes
     insights = relationship("BrandInsight", back_populates="brand", cascade="all, delete-orphan")
 
 class BrandInsight(Base):
@@ -16,4 +18,131 @@ class BrandInsight(Base):
     brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
     insights_json = Column(Text, nullable=False)  # Store as JSON string
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    brand = relationship("Brand", back_populates="insights") 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    brand = relationship("Brand", back_populates="insights") 
+
+class ScrapeJob(Base):
+    __tablename__ = "scrape_jobs"
+    id = Column(String(32), primary_key=True)
+    website_url = Column(String, index=True, nullable=False)
+    status = Column(String, index=True, nullable=False, default="queued")  # queued, running, succeeded, failed
+    progress = Column(Integer, nullable=False, default=0)  # sections finished
+    total = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class BulkRun(Base):
+    __tablename__ = "bulk_runs"
+    id = Column(String(32), primary_key=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, finished, interrupted
+    total = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)  # reset on every resume
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    items = relationship("BulkItem", back_populates="run", cascade="all, delete-orphan")
+
+class BulkItem(Base):
+    __tablename__ = "bulk_items"
+    __table_args__ = (Index("ix_bulk_items_run_status", "run_id", "status"),)
+    id = Column(Integer, primary_key=True)
+    run_id = Column(String(32), ForeignKey("bulk_runs.id"), nullable=False)
+    website_url = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, succeeded, failed
+    error = Column(Text, nullable=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    run = relationship("BulkRun", back_populates="items")
+
+class StoredProduct(Base):
+    __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_brand_kind_position", "brand_id", "kind", "position"),
+        Index("ix_products_kind_price", "kind", "price"),
+        Index("ix_products_brand_kind_key", "brand_id", "kind", "key"),
+    )
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    kind = Column(String(16), nullable=False)  # catalog, hero
+    position = Column(Integer, nullable=False)
+    handle = Column(String, nullable=True)
+    title = Column(String, nullable=False)
+    url = Column(String, nullable=False)
+    price = Column(Float, nullable=True)
+    image = Column(String, nullable=True)
+    vendor = Column(String, nullable=True)
+    product_type = Column(String, nullable=True)
+    tags = Column(Text, nullable=True)  # comma separated
+    search_text = Column(Text, nullable=False, default="")  # lowercased title, tags, vendor and type
+    content_hash = Column(String(64), nullable=True)  # sha256 of the product and its variants
+    key = Column(String, nullable=True)  # catalog match key across scrapes: the handle, or handle#position for repeats
+    scrape_token = Column(String(32), nullable=True)  # the catalog scrape that last wrote or matched this row
+    variants = relationship("StoredVariant", back_populates="product", cascade="all, delete-orphan")
+
+class StoredVariant(Base):
+    __tablename__ = "product_variants"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    title = Column(String, nullable=True)
+    sku = Column(String, nullable=True)
+    price = Column(Float, nullable=True, index=True)
+    compare_at_price = Column(Float, nullable=True)
+    available = Column(Boolean, nullable=True)
+    product = relationship("StoredProduct", back_populates="variants")
+
+class BrandText(Base):
+    __tablename__ = "brand_texts"
+    __table_args__ = (UniqueConstraint("brand_id", "section", name="uq_brand_texts_brand_section"),)
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    section = Column(String(32), nullable=False)  # privacy_policy, refund_policy, about
+    content = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=True)
+
+class BrandFaq(Base):
+    __tablename__ = "brand_faqs"
+    __table_args__ = (Index("ix_brand_faqs_brand_position", "brand_id", "position"),)
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+
+class BrandLink(Base):
+    __tablename__ = "brand_links"
+    __table_args__ = (Index("ix_brand_links_brand_section", "brand_id", "section"),)
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    section = Column(String(32), nullable=False)  # social_handles, important_links, contact_details
+    name = Column(String, nullable=False)  # platform, link label, or contact kind (email, phone, contact_page)
+    value = Column(Text, nullable=False)
+
+class BrandChange(Base):
+    __tablename__ = "brand_changes"
+    __table_args__ = (
+        Index("ix_brand_changes_brand_created", "brand_id", "created_at"),
+        Index("ix_brand_changes_created", "created_at"),
+    )
+    id = Column(Integer, primary_key=True)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    section = Column(String(32), nullable=True)  # None for the initial snapshot
+    key = Column(String, nullable=True)  # product handle for catalog changes
+    change = Column(String(16), nullable=False)  # created, added, removed, changed, price_changed
+    old_value = Column(Text, nullable=True)  # JSON
+    new_value = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DiscoveryProfile(Base):
+    __tablename__ = "discovery_profiles"
+    id = Column(Integer, primary_key=True)
+    host = Column(String, unique=True, index=True, nullable=False)
+    brand_id = Column(Integer, ForeignKey("brands.id"), nullable=True)
+    urls = Column(Text, nullable=False)  # JSON: section (privacy, refund, faq, about, contact) -> page URL
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,143 +1,285 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Optional
-import re
+import asyncio
+import httpx
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple, AsyncIterator
 import os
-import phonenumbers
-import openai
-from dotenv import load_dotenv
-load_dotenv()
+import logging
+from xml.etree import ElementTree
+from app.transport import Transport, get_transport, MAX_CONCURRENCY_PER_HOST
+from app.parsing import rank_faq_candidates, iter_sitemap_locs, is_content_sitemap, classify_sitemap_urls, same_site_url
+from app import extract, llm, metrics
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_PAGE_LIMIT = 250  # Shopify's maximum for /products.json
+CATALOG_PAGE_CONCURRENCY = int(os.getenv("SCRAPER_CATALOG_PAGE_CONCURRENCY", "4"))
+MAX_CATALOG_PAGES = int(os.getenv("SCRAPER_MAX_CATALOG_PAGES", "400"))
+FAQ_PROBE_BUDGET = int(os.getenv("SCRAPER_FAQ_PROBE_BUDGET", "6"))
+# Page discovery reads /sitemap.xml first and only guesses paths for stores without one
+SITEMAP_ENABLED = os.getenv("SCRAPER_USE_SITEMAP", "1") == "1"
+SITEMAP_MAX_CHILDREN = int(os.getenv("SCRAPER_SITEMAP_MAX_CHILDREN", "2"))
+SITEMAP_MAX_URLS = int(os.getenv("SCRAPER_SITEMAP_MAX_URLS", "50000"))
 
 class ShopifyScraper:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, transport: Optional[Transport] = None,
+                 combine_llm_fallbacks: bool = llm.LLM_COMBINE_FALLBACKS, profile: Optional[Dict[str, str]] = None):
         self.base_url = base_url.rstrip('/')
+        # Page URLs an earlier scrape resolved per section; tried before any discovery
+        self.profile = profile or {}
+        # Page URLs this scrape resolved, for the next one
+        self.resolved: Dict[str, str] = {}
+        self._transport = transport or get_transport()
+        # Optionally folds this brand's FAQ/contact/about LLM fallbacks into one request
+        self._llm_batch = llm.LLMBatch() if combine_llm_fallbacks else None
+        # Request-scoped document cache: url -> in-flight/finished response, and extraction results per page
+        self._responses: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._extracted: Dict[tuple, asyncio.Task] = {}
+        self._url_index: Optional[asyncio.Task] = None
+
+    def _swallowed(self, what: str, error: Exception) -> None:
+        # Extractors degrade to empty results, but every failure is logged and counted
+        logger.warning("Could not extract %s: %s: %s", what, type(error).__name__, error, exc_info=logger.isEnabledFor(logging.DEBUG))
+        metrics.inc("scrape_stage_errors_total", stage=metrics.stage.get(), error=type(error).__name__)
+
+    async def _get(self, url: str) -> Optional[httpx.Response]:
+        try:
+            return await self._transport.get(url)
+        except Exception as e:
+            logger.warning("GET %s failed: %s: %s", url, type(e).__name__, e)
+            return None
+
+    async def fetch(self, url: str) -> Optional[httpx.Response]:
+        # Concurrent extractors asking for the same URL share one request; it is cancelled (and fetched
+        # again if asked for later) once every caller waiting on it has been cancelled
+        url = url.rstrip('/')
+        if url not in self._responses:
+            self._responses[url] = asyncio.ensure_future(self._get(url))
+            self._waiters[url] = 0
+        request = self._responses[url]
+        self._waiters[url] += 1
+        try:
+            return await asyncio.shield(request)
+        except asyncio.CancelledError:
+            if self._waiters[url] == 1 and not request.done():
+                request.cancel()
+                del self._responses[url]
+            raise
+        finally:
+            self._waiters[url] -= 1
+
+    async def fetch_html(self, url: str) -> str:
+        resp = await self.fetch(url)
+        if resp is not None and resp.status_code == 200:
+            return resp.text
+        return ""
+
+    async def extract(self, fn: Callable[..., Any], url: str, *args: Any) -> Any:
+        # Runs fn(html, *args) on the page through the extraction executor, once per page and function;
+        # None when the page could not be fetched
+        key = (fn.__name__, url.rstrip('/'), args)
+        if key not in self._extracted:
+            self._extracted[key] = asyncio.ensure_future(self._extract(fn, url, *args))
+        return await asyncio.shield(self._extracted[key])
+
+    async def _extract(self, fn: Callable[..., Any], url: str, *args: Any) -> Any:
+        html = await self.fetch_html(url)
+        if not html:
+            return None
+        return await extract.run(fn, html, *args)
+
+    async def get_homepage(self) -> Optional[Dict[str, Any]]:
+        return await self.extract(extract.homepage, self.base_url, self.base_url)
+
+    async def get_homepage_links(self) -> Optional[Dict[str, Any]]:
+        homepage = await self.get_homepage()
+        return homepage['links'] if homepage else None
+
+    async def _has_page(self, url: str) -> bool:
+        return bool(await self.fetch_html(url))
+
+    async def _try_profile(self, section: str, check: Callable[[str], Awaitable[Any]]) -> Optional[Tuple[str, Any]]:
+        url = self.profile.get(section)
+        if not url:
+            return None
+        result = await check(url)
+        metrics.inc("discovery_profile_lookups_total", section=section, result="hit" if result else "miss")
+        return (url, result) if result else None
+
+    async def get_url_index(self) -> Optional[Dict[str, List[str]]]:
+        # Classified page URLs from the sitemap, built once per scrape; None when the store has no usable sitemap
+        if not SITEMAP_ENABLED:
+            return None
+        if self._url_index is None:
+            self._url_index = asyncio.ensure_future(self._build_url_index())
+        return await asyncio.shield(self._url_index)
 
-    def get_product_catalog(self) -> List[Dict[str, Any]]:
-        url = f"{self.base_url}/products.json"
+    async def _sitemap_locs(self, url: str) -> List[Tuple[str, str]]:
+        resp = await self._get(url)
+        if resp is None or resp.status_code != 200:
+            return []
+        locs = []
+        try:
+            for entry in iter_sitemap_locs(resp.content):
+                locs.append(entry)
+                if len(locs) >= SITEMAP_MAX_URLS:
+                    break
+        except ElementTree.ParseError as e:
+            self._swallowed("sitemap %s" % url, e)
+        return locs
+
+    async def _build_url_index(self) -> Optional[Dict[str, List[str]]]:
+        metrics.stage.set('discovery')
+        locs = await self._sitemap_locs(f"{self.base_url}/sitemap.xml")
+        if not locs:
+            return None
+        urls = [loc for kind, loc in locs if kind == 'url']
+        children = [same_site_url(self.base_url, loc) for kind, loc in locs if kind == 'sitemap' and is_content_sitemap(loc)]
+        for child_locs in await asyncio.gather(*(self._sitemap_locs(url) for url in children[:SITEMAP_MAX_CHILDREN])):
+            urls.extend(loc for kind, loc in child_locs if kind == 'url')
+        return classify_sitemap_urls(urls, self.base_url)
+
+    async def _probe_in_order(self, urls: List[str], check: Callable[[str], Awaitable[Any]],
+                              window: Optional[int] = None) -> Optional[Tuple[str, Any]]:
+        # Probes a window of URLs at a time; the earliest URL in list order that passes wins
+        window = window or len(urls) or 1
+        for i in range(0, len(urls), window):
+            batch = urls[i:i + window]
+            results = await asyncio.gather(*(check(url) for url in batch))
+            for url, result in zip(batch, results):
+                if result:
+                    return url, result
+        return None
+
+    async def _probe_first(self, urls: List[str], check: Callable[[str], Awaitable[Any]]) -> Optional[str]:
+        # Probes every URL at once and returns whichever passes first, by arrival; the losing probes'
+        # requests are cancelled unless another extractor is waiting on the same page
+        tasks = {asyncio.ensure_future(check(url)): url for url in urls}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and task.result():
+                        return tasks[task]
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _main_text(self, url: str, min_length: int = 100) -> Optional[str]:
+        text = await self.extract(extract.main_text, url)
+        if text and len(text) > min_length:
+            return text
+        return None
+
+    async def _fetch_products_page(self, page: int) -> List[Dict[str, Any]]:
+        # Catalog pages bypass the document cache; each one is consumed once
+        url = f"{self.base_url}/products.json?limit={PRODUCTS_PAGE_LIMIT}&page={page}"
+        resp = await self._get(url)
         try:
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
+            if resp is not None and resp.status_code == 200:
                 data = resp.json()
                 return data.get('products', [])
             else:
                 return []
-        except Exception:
+        except Exception as e:
+            self._swallowed("catalog page %d of %s" % (page, self.base_url), e)
             return []
 
-    def get_hero_products(self) -> List[Dict[str, Any]]:
-        html = self.fetch_homepage_html()
-        if not html:
+    async def iter_product_pages(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        # Yields pages in order, so callers only ever hold a few pages of raw products in memory.
+        # Page 1 is fetched alone; only when it is full are the next CATALOG_PAGE_CONCURRENCY fetched at a time.
+        page = 1
+        batch = 1
+        while page <= MAX_CATALOG_PAGES:
+            last = min(page + batch, MAX_CATALOG_PAGES + 1)
+            results = await asyncio.gather(*(self._fetch_products_page(n) for n in range(page, last)))
+            for products in results:
+                if not products:
+                    return
+                yield products
+                if len(products) < PRODUCTS_PAGE_LIMIT:
+                    return
+            page = last
+            batch = CATALOG_PAGE_CONCURRENCY
+        logger.warning("Catalog of %s cut off at %d pages (SCRAPER_MAX_CATALOG_PAGES); later products are skipped",
+                       self.base_url, MAX_CATALOG_PAGES)
+        metrics.inc("catalog_truncated_total")
+
+    async def iter_product_catalog(self) -> AsyncIterator[Dict[str, Any]]:
+        async for products in self.iter_product_pages():
+            for product in products:
+                yield product
+
+    async def get_product_catalog(self) -> List[Dict[str, Any]]:
+        return [product async for product in self.iter_product_catalog()]
+
+    async def get_hero_products(self) -> List[Dict[str, Any]]:
+        links = await self.get_homepage_links()
+        if links is None:
             return []
-        soup = BeautifulSoup(html, 'html.parser')
-        hero_products = []
-        for a in soup.find_all('a', href=True):
-            href = a['href']
-            if '/products/' in href:
-                title = a.get_text(strip=True)
-                img = a.find('img')
-                image_url = img['src'] if img and img.has_attr('src') else None
-                product_url = href if href.startswith('http') else f"{self.base_url}{href if href.startswith('/') else '/' + href}"
-                hero_products.append({
-                    'title': title,
-                    'url': product_url,
-                    'image': image_url
-                })
-        seen = set()
-        unique_hero_products = []
-        for p in hero_products:
-            if p['url'] not in seen and p['title']:
-                unique_hero_products.append(p)
-                seen.add(p['url'])
-        return unique_hero_products
-
-    def fetch_homepage_html(self) -> str:
-        try:
-            resp = requests.get(self.base_url, timeout=10)
-            if resp.status_code == 200:
-                return resp.text
-            else:
-                return ""
-        except Exception:
-            return ""
+        return links['hero_products']
+
+    async def fetch_homepage_html(self) -> str:
+        return await self.fetch_html(self.base_url)
 
-    def get_policy_text(self, policy_type: str) -> Optional[str]:
+    async def get_policy_text(self, policy_type: str) -> Optional[str]:
         policy_paths = {
             'privacy': ['/policies/privacy-policy', '/pages/privacy-policy', '/privacy-policy'],
             'refund': ['/policies/refund-policy', '/pages/refund-policy', '/refund-policy', '/policies/return-policy', '/pages/return-policy', '/return-policy']
         }
-        for path in policy_paths.get(policy_type, []):
-            url = f"{self.base_url}{path}"
-            try:
-                resp = requests.get(url, timeout=10)
-                if resp.status_code == 200:
-                    soup = BeautifulSoup(resp.text, 'html.parser')
-                    main = soup.find('main') or soup.find('div', {'id': 'MainContent'}) or soup
-                    text = main.get_text(separator='\n', strip=True)
-                    if text and len(text) > 100:
-                        return text
-            except Exception:
-                continue
-        html = self.fetch_homepage_html()
-        if not html:
-            return None
-        soup = BeautifulSoup(html, 'html.parser')
-        if policy_type == 'refund':
-            keywords = ['refund', 'return', 'exchange']
+        paths = policy_paths.get(policy_type, [])
+        found = await self._try_profile(policy_type, self._main_text)
+        if found:
+            self.resolved[policy_type] = found[0]
+            return found[1]
+        index = await self.get_url_index()
+        if index is not None:
+            # Shopify's /policies/ pages are usually missing from the sitemap, so the canonical path is kept
+            urls = list(dict.fromkeys(index[policy_type] + [f"{self.base_url}{path}" for path in paths[:1]]))
         else:
-            keywords = [policy_type]
-        for a in soup.find_all('a', href=True):
-            href = a['href'].lower()
-            if any(kw in href for kw in keywords):
-                url = href if href.startswith('http') else f"{self.base_url}{href if href.startswith('/') else '/' + href}"
-                try:
-                    resp = requests.get(url, timeout=10)
-                    if resp.status_code == 200:
-                        soup2 = BeautifulSoup(resp.text, 'html.parser')
-                        main = soup2.find('main') or soup2.find('div', {'id': 'MainContent'}) or soup2
-                        text = main.get_text(separator='\n', strip=True)
-                        if text and len(text) > 100:
-                            return text
-                except Exception:
-                    continue
+            urls = [f"{self.base_url}{path}" for path in paths]
+        found = await self._probe_in_order(urls, self._main_text)
+        if found:
+            self.resolved[policy_type] = found[0]
+            return found[1]
+        links = await self.get_homepage_links()
+        if links is None:
+            return None
+        candidate_links = links['policy_links'].get(policy_type, [])
+        found = await self._probe_in_order(candidate_links, self._main_text, window=MAX_CONCURRENCY_PER_HOST)
+        if found:
+            self.resolved[policy_type] = found[0]
+            return found[1]
         if policy_type == 'refund':
-            for kw in ['refund', 'return', 'exchange']:
-                for section in soup.find_all(['section', 'div', 'p']):
-                    if section.get_text() and kw in section.get_text().lower():
-                        text = section.get_text(separator='\n', strip=True)
-                        if text and len(text) > 50:
-                            return text
+            return await self.extract(extract.keyword_section, self.base_url, ('refund', 'return', 'exchange'))
         return None
 
-    def get_privacy_policy(self) -> Optional[str]:
-        return self.get_policy_text('privacy')
+    async def get_privacy_policy(self) -> Optional[str]:
+        return await self.get_policy_text('privacy')
 
-    def get_refund_policy(self) -> Optional[str]:
-        return self.get_policy_text('refund')
+    async def get_refund_policy(self) -> Optional[str]:
+        return await self.get_policy_text('refund')
 
-    def extract_faqs_with_llm(self, text: str) -> list:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        prompt = (
-            "Extract all FAQ question and answer pairs from the following text. "
-            "Return as a JSON array of objects with 'question' and 'answer'. "
-            "Text:\n" + text
-        )
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=512,
-                temperature=0
-            )
-            import json
-            content = response.choices[0].message.content
-            data = json.loads(content)
-            if isinstance(data, list):
-                return [faq for faq in data if faq.get('question') and faq.get('answer')]
-            return []
-        except Exception:
-            return []
+    async def _page_mentions(self, url: str, words: Tuple[str, ...]) -> bool:
+        html = (await self.fetch_html(url)).lower()
+        return any(word in html for word in words)
+
+    async def _is_faq_page(self, url: str) -> bool:
+        return await self._page_mentions(url, ('faq', 'question'))
 
-    def get_faqs(self) -> list:
+    async def _is_about_page(self, url: str) -> bool:
+        return await self._page_mentions(url, ('about', 'story'))
+
+    async def _llm(self, kind: str, text: str) -> Optional[str]:
+        if self._llm_batch is not None:
+            return await self._llm_batch.submit(kind, text)
+        return await llm.run_task(kind, text)
+
+    async def extract_faqs_with_llm(self, text: str) -> list:
+        return llm.parse_faqs(await self._llm('faqs', text))
+
+    async def get_faqs(self) -> list:
         faq_paths = [
             '/pages/faq', '/pages/faqs', '/faq', '/faqs',
             '/pages/help', '/help', '/pages/support', '/support',
@@ -145,176 +287,89 @@ class ShopifyScraper:
         ]
         checked_urls = set()
         faq_url = None
-        for path in faq_paths:
-            url = f"{self.base_url}{path}"
-            checked_urls.add(url)
-            try:
-                resp = requests.get(url, timeout=10)
-                if resp.status_code == 200 and ('faq' in resp.text.lower() or 'question' in resp.text.lower()):
-                    faq_url = url
-                    break
-            except Exception:
-                continue
-        html = self.fetch_homepage_html()
-        candidate_links = []
-        if html:
-            soup = BeautifulSoup(html, 'html.parser')
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                if not href.startswith('http'):
-                    href = f"{self.base_url}{href if href.startswith('/') else '/' + href}"
-                if href not in checked_urls:
-                    candidate_links.append(href)
-        for link in candidate_links:
-            try:
-                resp = requests.get(link, timeout=10)
-                if resp.status_code == 200 and ('faq' in resp.text.lower() or 'question' in resp.text.lower()):
-                    faq_url = link
-                    break
-            except Exception:
-                continue
+        found = await self._try_profile('faq', self._is_faq_page)
+        if not found:
+            index = await self.get_url_index()
+            if index is not None:
+                urls = index['faq'][:FAQ_PROBE_BUDGET]
+            else:
+                urls = [f"{self.base_url}{path}" for path in faq_paths]
+            checked_urls.update(urls)
+            found = await self._probe_in_order(urls, self._is_faq_page)
+        if found:
+            faq_url = found[0]
+        if not faq_url:
+            links = await self.get_homepage_links()
+            if links is not None:
+                candidates = rank_faq_candidates(links['anchors'], self.base_url, exclude=checked_urls)
+                faq_url = await self._probe_first(candidates[:FAQ_PROBE_BUDGET], self._is_faq_page)
         if not faq_url:
             return []
+        self.resolved['faq'] = faq_url
         try:
-            resp = requests.get(faq_url, timeout=10)
-            if resp.status_code != 200:
+            page = await self.extract(extract.faqs, faq_url)
+            if page is None:
                 return []
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            faqs = []
-            for item in soup.find_all(class_=['faq', 'faq-item']):
-                q = item.find(['h2', 'h3', 'h4', 'strong', 'b'])
-                a = item.find('p')
-                if q and a:
-                    faqs.append({'question': q.get_text(strip=True), 'answer': a.get_text(strip=True)})
-            for details in soup.find_all('details'):
-                summary = details.find('summary')
-                if summary:
-                    answer = details.get_text(separator='\n', strip=True).replace(summary.get_text(strip=True), '').strip()
-                    faqs.append({'question': summary.get_text(strip=True), 'answer': answer})
-            questions = soup.find_all(['h2', 'h3', 'h4', 'b', 'strong'])
-            for q in questions:
-                next_p = q.find_next_sibling('p')
-                if next_p:
-                    faqs.append({'question': q.get_text(strip=True), 'answer': next_p.get_text(strip=True)})
-                next_list = q.find_next_sibling(['ul', 'ol'])
-                if next_list:
-                    answer = '\n'.join(li.get_text(strip=True) for li in next_list.find_all('li'))
-                    faqs.append({'question': q.get_text(strip=True), 'answer': answer})
-            for li in soup.find_all('li'):
-                q = li.find(['strong', 'b'])
-                if q:
-                    answer = li.get_text(strip=True).replace(q.get_text(strip=True), '').strip()
-                    if answer:
-                        faqs.append({'question': q.get_text(strip=True), 'answer': answer})
-            seen = set()
-            unique_faqs = []
-            for faq in faqs:
-                key = (faq['question'], faq['answer'])
-                if key not in seen and faq['question'] and faq['answer']:
-                    unique_faqs.append(faq)
-                    seen.add(key)
-            if not unique_faqs:
-                all_text = soup.get_text(separator='\n', strip=True)
-                unique_faqs = self.extract_faqs_with_llm(all_text)
-            return unique_faqs
-        except Exception:
+            if not page['faqs']:
+                return await self.extract_faqs_with_llm(page['text'])
+            return page['faqs']
+        except Exception as e:
+            self._swallowed("FAQs for %s" % self.base_url, e)
             return []
 
-    def get_social_handles(self) -> dict:
-        html = self.fetch_homepage_html()
-        if not html:
+    async def get_social_handles(self) -> dict:
+        links = await self.get_homepage_links()
+        if links is None:
             return {}
-        soup = BeautifulSoup(html, 'html.parser')
-        social_domains = {
-            'instagram': 'instagram.com',
-            'facebook': 'facebook.com',
-            'tiktok': 'tiktok.com',
-            'twitter': 'twitter.com',
-            'youtube': 'youtube.com',
-            'pinterest': 'pinterest.com',
-            'linkedin': 'linkedin.com',
-            'snapchat': 'snapchat.com',
-            'whatsapp': 'wa.me',
-            'telegram': 't.me',
-        }
-        handles = {}
-        for a in soup.find_all('a', href=True):
-            href = a['href']
-            for platform, domain in social_domains.items():
-                if domain in href:
-                    handles[platform] = href
-        return handles
-
-    def extract_contact_with_llm(self, text: str) -> dict:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        prompt = (
-            "Extract all email addresses and phone numbers from the following text. "
-            "Return them as a JSON object with 'emails' and 'phones' fields. "
-            "Text:\n" + text
-        )
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=256,
-                temperature=0
-            )
-            import json
-            content = response.choices[0].message.content
-            data = json.loads(content)
-            return {
-                "emails": data.get("emails", []),
-                "phones": data.get("phones", [])
-            }
-        except Exception:
-            return {"emails": [], "phones": []}
-
-    def get_contact_details(self) -> dict:
-        html = self.fetch_homepage_html()
+        return links['social_handles']
+
+    async def extract_contact_with_llm(self, text: str) -> dict:
+        return llm.parse_contact(await self._llm('contact', text))
+
+    async def _contact_candidates(self, links: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+        # The profile's page, then the sitemap's, then the homepage link; later ones are only looked up if needed
+        found = await self._try_profile('contact', self._has_page)
+        if found:
+            yield found[0]
+        index = await self.get_url_index()
+        if index is not None and index['contact']:
+            yield index['contact'][0]
+        if links and links['contact_url']:
+            yield links['contact_url']
+
+    async def get_contact_details(self) -> dict:
+        homepage = await self.get_homepage()
+        links = homepage['links'] if homepage else None
         emails = set()
         phones = set()
-        contact_page_url = None
-        email_pattern = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
-        def is_real_email(email):
-            if any(char.isdigit() for char in email.split('@')[1].split('.')[0]):
-                return False
-            if any(email.endswith(f"@{suffix}") for suffix in ["6.8.6", "1.8.2", "2.0.1", "0.2.6"]):
-                return False
-            return True
         all_text = ""
-        if html:
-            soup = BeautifulSoup(html, 'html.parser')
-            for tag in soup(['script', 'style', 'noscript', 'svg', 'meta', 'head', 'title', 'link']):
-                tag.decompose()
-            all_text = soup.get_text(separator='\n', strip=True)
-            emails.update([e for e in email_pattern.findall(all_text) if is_real_email(e)])
-            for a in soup.find_all('a', href=True):
-                href = a['href'].lower()
-                if any(x in href for x in ['contact', 'support', 'customer-service']):
-                    contact_page_url = href if href.startswith('http') else f"{self.base_url}{href if href.startswith('/') else '/' + href}"
-                    break
-            for match in phonenumbers.PhoneNumberMatcher(all_text, "IN"):
-                num = phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.E164)
-                phones.add(num)
+        if homepage is not None:
+            all_text = homepage['text']
+            emails.update(homepage['emails'])
+            phones.update(homepage['phones'])
+        contact_page_url = None
         contact_text = ""
-        if contact_page_url:
+        tried = set()
+        async for url in self._contact_candidates(links):
+            if url in tried:
+                continue
+            tried.add(url)
             try:
-                resp = requests.get(contact_page_url, timeout=10)
-                if resp.status_code == 200:
-                    soup = BeautifulSoup(resp.text, 'html.parser')
-                    for tag in soup(['script', 'style', 'noscript', 'svg', 'meta', 'head', 'title', 'link']):
-                        tag.decompose()
-                    contact_text = soup.get_text(separator='\n', strip=True)
-                    emails.update([e for e in email_pattern.findall(contact_text) if is_real_email(e)])
-                    for match in phonenumbers.PhoneNumberMatcher(contact_text, "IN"):
-                        num = phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.E164)
-                        phones.add(num)
-            except Exception:
-                pass
+                page = await self.extract(extract.contact_page, url)
+            except Exception as err:
+                self._swallowed("contact page %s" % url, err)
+                continue
+            if page is not None:
+                contact_page_url = url
+                self.resolved['contact'] = url
+                contact_text = page['text']
+                emails.update(page['emails'])
+                phones.update(page['phones'])
+                break
         emails_list = list(emails)[:5]
         phones_list = list(phones)[:5]
         if not emails_list and not phones_list:
-            llm_result = self.extract_contact_with_llm(contact_text or all_text)
+            llm_result = await self.extract_contact_with_llm(contact_text or all_text)
             emails_list = llm_result["emails"][:5]
             phones_list = llm_result["phones"][:5]
         return {
@@ -323,89 +378,51 @@ class ShopifyScraper:
             'contact_page': contact_page_url
         }
 
-    def extract_about_with_llm(self, text: str) -> str:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        prompt = (
-            "Summarize the following text as a concise brand description suitable for an 'About Us' section. "
-            "Return only the summary text.\nText:\n" + text
-        )
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=256,
-                temperature=0
-            )
-            return response.choices[0].message.content.strip()
-        except Exception:
-            return None
+    async def extract_about_with_llm(self, text: str) -> Optional[str]:
+        content = await self._llm('about', text)
+        return content.strip() if content else None
 
-    def get_about(self) -> str:
+    async def get_about(self) -> str:
         about_paths = [
             '/pages/about', '/about', '/about-us', '/pages/about-us',
             '/pages/our-story', '/our-story', '/pages/brand-story', '/brand-story'
         ]
         about_url = None
-        for path in about_paths:
-            url = f"{self.base_url}{path}"
-            try:
-                resp = requests.get(url, timeout=10)
-                if resp.status_code == 200 and ('about' in resp.text.lower() or 'story' in resp.text.lower()):
-                    about_url = url
-                    break
-            except Exception:
-                continue
+        found = await self._try_profile('about', self._is_about_page)
+        if not found:
+            index = await self.get_url_index()
+            checked = set()
+            if index is not None:
+                # The sitemap's pages go first; the usual paths are still tried when none of them passes
+                found = await self._probe_in_order(index['about'], self._is_about_page)
+                checked.update(index['about'])
+            if not found:
+                urls = [url for url in (f"{self.base_url}{path}" for path in about_paths) if url not in checked]
+                found = await self._probe_in_order(urls, self._is_about_page)
+        if found:
+            about_url = found[0]
         if not about_url:
-            html = self.fetch_homepage_html()
-            if html:
-                soup = BeautifulSoup(html, 'html.parser')
-                for a in soup.find_all('a', href=True):
-                    href = a['href'].lower()
-                    if 'about' in href or 'story' in href:
-                        about_url = href if href.startswith('http') else f"{self.base_url}{href if href.startswith('/') else '/' + href}"
-                        break
+            links = await self.get_homepage_links()
+            if links is not None:
+                about_url = links['about_url']
         about_text = None
         if about_url:
             try:
-                resp = requests.get(about_url, timeout=10)
-                if resp.status_code == 200:
-                    soup = BeautifulSoup(resp.text, 'html.parser')
-                    main = soup.find('main') or soup.find('div', {'id': 'MainContent'}) or soup
-                    about_text = main.get_text(separator='\n', strip=True)
-                    if about_text and len(about_text) > 100:
-                        return about_text.strip()
-            except Exception:
-                pass
-        html = self.fetch_homepage_html()
-        if html:
-            soup = BeautifulSoup(html, 'html.parser')
-            all_text = soup.get_text(separator='\n', strip=True)
-            summary = self.extract_about_with_llm(all_text)
+                about_text = await self.extract(extract.main_text, about_url)
+                if about_text and len(about_text) > 100:
+                    self.resolved['about'] = about_url
+                    return about_text.strip()
+            except Exception as e:
+                self._swallowed("about page %s" % about_url, e)
+        all_text = await self.extract(extract.llm_text, self.base_url)
+        if all_text is not None:
+            summary = await self.extract_about_with_llm(all_text)
             if summary:
                 return summary
         return None
 
-    def get_important_links(self) -> dict:
-        html = self.fetch_homepage_html()
-        if not html:
+    async def get_important_links(self) -> dict:
+        links = await self.get_homepage_links()
+        if links is None:
             return {}
-        soup = BeautifulSoup(html, 'html.parser')
-        keywords = {
-            'order_tracking': ['track', 'tracking', 'order status'],
-            'contact_us': ['contact'],
-            'blog': ['blog'],
-            'support': ['support', 'help'],
-            'returns': ['return', 'refund', 'exchange'],
-            'policy': ['policy'],
-            'faq': ['faq', 'questions']
-        }
-        links = {}
-        for a in soup.find_all('a', href=True):
-            text = a.get_text(strip=True).lower()
-            href = a['href']
-            for key, kw_list in keywords.items():
-                if any(kw in text or kw in href.lower() for kw in kw_list):
-                    url = href if href.startswith('http') else f"{self.base_url}{href if href.startswith('/') else '/' + href}"
-                    if key not in links:
-                        links[key] = url
-        return links 
\ No newline at end of file
+        return links['important_links'] 
\ No newline at end of file
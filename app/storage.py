@@ -0,0 +1,431 @@
+import difflib
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.orm import Session
+from app.models import BrandInsights, Product
+from app.schemas import Brand, BrandInsight, BrandChange, StoredProduct, StoredVariant, BrandText, BrandFaq, BrandLink
+
+PRODUCT_SECTIONS = {'product_catalog': 'catalog', 'hero_products': 'hero'}
+TEXT_SECTIONS = ('privacy_policy', 'refund_policy', 'about')
+LINK_SECTIONS = ('social_handles', 'important_links', 'contact_details')
+CONTACT_LISTS = {'email': 'emails', 'phone': 'phones'}
+SECTION_NAMES = list(BrandInsights.model_fields)
+# Sections small enough to be compared and rewritten as a whole
+WHOLE_SECTIONS = ('hero_products', 'faqs') + LINK_SECTIONS
+PRODUCT_DIFF_FIELDS = ('title', 'url', 'price', 'image', 'vendor', 'product_type', 'tags', 'variants')
+
+def content_hash(value: Any) -> str:
+    payload = value if isinstance(value, str) else json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def product_row(brand_id: int, kind: str, position: int, product: Product, key: Optional[str] = None,
+                token: Optional[str] = None) -> dict:
+    search_text = ' '.join(filter(None, [product.title, ' '.join(product.tags), product.vendor, product.product_type]))
+    return {
+        "brand_id": brand_id,
+        "kind": kind,
+        "position": position,
+        "handle": product.handle,
+        "title": product.title,
+        "url": product.url,
+        "price": product.price,
+        "image": product.image,
+        "vendor": product.vendor,
+        "product_type": product.product_type,
+        "tags": ','.join(product.tags) or None,
+        "search_text": search_text.lower(),
+        "content_hash": content_hash(product.model_dump()),
+        "key": key,
+        "scrape_token": token,
+    }
+
+def normalized_section(insights: BrandInsights, section: str) -> Any:
+    # The value in the shape read_sections returns it, so stored and scraped sections compare equal
+    value = getattr(insights, section)
+    if section == 'hero_products':
+        return [p.model_dump() for p in value]
+    if section == 'faqs':
+        return [{"question": str(faq.get('question', '')), "answer": str(faq.get('answer', ''))} for faq in value]
+    if section == 'contact_details':
+        return {
+            "emails": [str(v) for v in value.get('emails') or []],
+            "phones": [str(v) for v in value.get('phones') or []],
+            "contact_page": str(value['contact_page']) if value.get('contact_page') else None,
+        }
+    return {str(name): str(v) for name, v in value.items() if v}
+
+def section_rows(brand_id: int, section: str, value: Any) -> List[dict]:
+    if section == 'faqs':
+        return [{"brand_id": brand_id, "position": i, **faq} for i, faq in enumerate(value)]
+    if section == 'contact_details':
+        rows = [{"brand_id": brand_id, "section": section, "name": name, "value": v}
+                for name, field in CONTACT_LISTS.items() for v in value[field]]
+        if value['contact_page']:
+            rows.append({"brand_id": brand_id, "section": section, "name": "contact_page", "value": value['contact_page']})
+        return rows
+    return [{"brand_id": brand_id, "section": section, "name": name, "value": v} for name, v in value.items()]
+
+def insert_products(db: Session, brand_id: int, kind: str, products: List[Tuple[int, Product]],
+                    keys: Optional[List[str]] = None, token: Optional[str] = None) -> None:
+    if not products:
+        return
+    ids = db.execute(
+        insert(StoredProduct).returning(StoredProduct.id, sort_by_parameter_order=True),
+        [product_row(brand_id, kind, position, p, keys[i] if keys else None, token)
+         for i, (position, p) in enumerate(products)],
+    ).scalars().all()
+    insert_variants(db, brand_id, zip(ids, (p for _, p in products)))
+
+def insert_variants(db: Session, brand_id: int, products: Iterable[Tuple[int, Product]]) -> None:
+    variants = [
+        {"product_id": product_id, "brand_id": brand_id, "position": i, **variant.model_dump()}
+        for product_id, product in products
+        for i, variant in enumerate(product.variants)
+    ]
+    if variants:
+        db.execute(insert(StoredVariant), variants)
+
+def replace_section(db: Session, brand_id: int, section: str, value: Any) -> None:
+    if section == 'hero_products':
+        db.execute(delete(StoredVariant).where(StoredVariant.product_id.in_(
+            select(StoredProduct.id).where(StoredProduct.brand_id == brand_id, StoredProduct.kind == 'hero'))))
+        db.execute(delete(StoredProduct).where(StoredProduct.brand_id == brand_id, StoredProduct.kind == 'hero'))
+        insert_products(db, brand_id, 'hero', [(i, Product(**p)) for i, p in enumerate(value)])
+        return
+    table = BrandFaq if section == 'faqs' else BrandLink
+    query = delete(table).where(table.brand_id == brand_id)
+    if table is BrandLink:
+        query = query.where(BrandLink.section == section)
+    db.execute(query)
+    rows = section_rows(brand_id, section, value)
+    if rows:
+        db.execute(insert(table), rows)
+
+def backfill_catalog_keys(db: Session, brand_id: int) -> None:
+    # Rows stored before catalog keys existed get the key their position gave them: the handle, with the
+    # position appended for every repeat of a handle
+    missing = db.execute(select(StoredProduct.id).where(
+        StoredProduct.brand_id == brand_id, StoredProduct.kind == 'catalog', StoredProduct.key.is_(None)).limit(1)).first()
+    if missing is None:
+        return
+    seen = set()
+    updates = []
+    for product_id, handle, url, position in db.execute(
+            select(StoredProduct.id, StoredProduct.handle, StoredProduct.url, StoredProduct.position)
+            .where(StoredProduct.brand_id == brand_id, StoredProduct.kind == 'catalog')
+            .order_by(StoredProduct.position)).tuples():
+        base = handle or url
+        updates.append({"id": product_id, "key": f"{base}#{position}" if base in seen else base})
+        seen.add(base)
+    db.execute(update(StoredProduct), updates)
+
+def write_catalog_page(db: Session, brand: Brand, token: str, start: int, products: List[Product],
+                       version: Optional[int] = None) -> Optional[int]:
+    # Saves one page of a catalog scrape at positions start onwards. Products are matched to stored rows by
+    # key; every row the page writes or matches is marked with the scrape's token, and finish_catalog
+    # removes the rest once the last page is in. Changes are recorded under the scrape's version, which is
+    # allocated by the first page that has any and returned.
+    if not products:
+        return version
+    first = brand.scraped_at is None
+    if not first:
+        backfill_catalog_keys(db, brand.id)
+    bases = [product.handle or product.url for product in products]
+    candidates = set(bases) | {f"{base}#{start + i}" for i, base in enumerate(bases)}
+    stored: Dict[str, Any] = {}
+    used = set()
+    for row in db.execute(
+            select(StoredProduct.id, StoredProduct.key, StoredProduct.position, StoredProduct.content_hash,
+                   StoredProduct.scrape_token)
+            .where(StoredProduct.brand_id == brand.id, StoredProduct.kind == 'catalog', StoredProduct.key.in_(candidates))):
+        if row.scrape_token == token:
+            # Written by an earlier page of this scrape
+            used.add(row.key)
+        elif not first:
+            stored[row.key] = row
+    keys = []
+    for i, base in enumerate(bases):
+        keys.append(f"{base}#{start + i}" if base in used else base)
+        used.add(base)
+
+    changes: List[dict] = []
+    added = [(i, key) for i, key in enumerate(keys) if key not in stored]
+    kept = [(i, key, stored[key]) for i, key in enumerate(keys) if key in stored]
+    changed = [(i, key, row) for i, key, row in kept if row.content_hash != content_hash(products[i].model_dump())]
+    changed_ids = {row.id for _, _, row in changed}
+    unchanged = [(start + i, row) for i, _, row in kept if row.id not in changed_ids]
+    moved = [{"id": row.id, "position": position, "scrape_token": token} for position, row in unchanged
+             if row.position != position]
+    marked = [row.id for position, row in unchanged if row.position == position]
+    if added:
+        insert_products(db, brand.id, 'catalog', [(start + i, products[i]) for i, _ in added],
+                        keys=[key for _, key in added], token=token)
+        if not first:
+            changes.extend({"section": "product_catalog", "key": key, "change": "added", "old_value": None,
+                            "new_value": {"title": products[i].title, "price": products[i].price}} for i, key in added)
+    if changed:
+        ids = [row.id for _, _, row in changed]
+        previous = {p['id']: p for p in read_products(db, brand.id, 'catalog', ids=ids, with_ids=True)}
+        db.execute(update(StoredProduct), [{"id": row.id, **product_row(brand.id, 'catalog', start + i, products[i], key, token)}
+                                           for i, key, row in changed])
+        db.execute(delete(StoredVariant).where(StoredVariant.product_id.in_(ids)))
+        insert_variants(db, brand.id, ((row.id, products[i]) for i, _, row in changed))
+        for i, key, row in changed:
+            before, after = previous[row.id], products[i].model_dump()
+            fields = [f for f in PRODUCT_DIFF_FIELDS if before.get(f) != after.get(f)]
+            if not fields:
+                continue
+            changes.append({"section": "product_catalog", "key": key,
+                            "change": "price_changed" if 'price' in fields else "changed",
+                            "old_value": {f: before.get(f) for f in fields},
+                            "new_value": {f: after.get(f) for f in fields}})
+    if moved:
+        db.execute(update(StoredProduct), moved)
+    if marked:
+        db.execute(update(StoredProduct).where(StoredProduct.id.in_(marked)).values(scrape_token=token))
+    return record_changes(db, brand, changes, version)
+
+def finish_catalog(db: Session, brand: Brand, token: str) -> List[dict]:
+    # Deletes the catalog rows a finished scrape did not see and returns them as removals
+    unseen = (StoredProduct.brand_id == brand.id, StoredProduct.kind == 'catalog',
+              or_(StoredProduct.scrape_token.is_(None), StoredProduct.scrape_token != token))
+    rows = db.execute(select(StoredProduct.key, StoredProduct.handle, StoredProduct.url, StoredProduct.title,
+                             StoredProduct.price).where(*unseen)).all()
+    if not rows:
+        return []
+    db.execute(delete(StoredVariant).where(StoredVariant.product_id.in_(select(StoredProduct.id).where(*unseen))))
+    db.execute(delete(StoredProduct).where(*unseen))
+    return [{"section": "product_catalog", "key": row.key or row.handle or row.url, "change": "removed",
+             "old_value": {"title": row.title, "price": row.price}, "new_value": None} for row in rows]
+
+def record_changes(db: Session, brand: Brand, changes: List[dict], version: Optional[int] = None) -> Optional[int]:
+    # All changes of one scrape share a version; the first of them to be written bumps the brand's version
+    if not changes:
+        return version
+    if version is None:
+        brand.version = (brand.version or 0) + 1
+        version = brand.version
+    db.execute(insert(BrandChange), [{
+        "brand_id": brand.id,
+        "version": version,
+        "section": c["section"],
+        "key": c["key"],
+        "change": c["change"],
+        "old_value": json.dumps(c["old_value"]) if c["old_value"] is not None else None,
+        "new_value": json.dumps(c["new_value"]) if c["new_value"] is not None else None,
+    } for c in changes])
+    return version
+
+def diff_texts(db: Session, brand_id: int, insights: BrandInsights) -> List[dict]:
+    # Policies and about text are compared by hash; a change is kept as a unified diff
+    stored = {row.section: row for row in db.execute(
+        select(BrandText.id, BrandText.section, BrandText.content_hash)
+        .where(BrandText.brand_id == brand_id)
+    )}
+    changes = []
+    for section in TEXT_SECTIONS:
+        content = getattr(insights, section) or None
+        row = stored.get(section)
+        new_hash = content_hash(content) if content else None
+        if (row.content_hash if row else None) == new_hash:
+            continue
+        old_content = db.execute(select(BrandText.content).where(BrandText.id == row.id)).scalar() if row else None
+        if row is not None:
+            db.execute(delete(BrandText).where(BrandText.id == row.id))
+        if content:
+            db.execute(insert(BrandText), [{"brand_id": brand_id, "section": section, "content": content,
+                                            "content_hash": new_hash}])
+        diff = '\n'.join(difflib.unified_diff((old_content or '').splitlines(), (content or '').splitlines(),
+                                              lineterm='', n=1))
+        changes.append({"section": section, "key": None,
+                        "change": "added" if row is None else "removed" if not content else "changed",
+                        "old_value": {"hash": row.content_hash if row else None, "length": len(old_content or '')},
+                        "new_value": {"hash": new_hash, "length": len(content or ''), "diff": diff}})
+    return changes
+
+def write_insights(db: Session, brand: Brand, insights: BrandInsights, token: str, version: Optional[int] = None,
+                   catalog_complete: bool = True) -> int:
+    # Applies only what changed since the stored snapshot and records each change under the scrape's version.
+    # The catalog pages are already written under token; once the catalog is complete the products it did
+    # not see are removed. The caller owns the transaction. Returns the number of changes recorded here.
+    first = brand.scraped_at is None
+    changes = finish_catalog(db, brand, token) if catalog_complete else []
+    if first:
+        for table in (BrandText, BrandFaq, BrandLink):
+            db.execute(delete(table).where(table.brand_id == brand.id))
+    stored = read_sections(db, brand.id, WHOLE_SECTIONS) if not first else {}
+    for section in WHOLE_SECTIONS:
+        value = normalized_section(insights, section)
+        if first:
+            replace_section(db, brand.id, section, value)
+        elif stored[section] != value:
+            replace_section(db, brand.id, section, value)
+            changes.append({"section": section, "key": None, "change": "changed",
+                            "old_value": stored[section], "new_value": value})
+    text_changes = diff_texts(db, brand.id, insights)
+    if first:
+        changes = [{"section": None, "key": None, "change": "created", "old_value": None, "new_value": None}]
+    else:
+        changes.extend(text_changes)
+    record_changes(db, brand, changes, version)
+    return len(changes)
+
+def read_products(db: Session, brand_id: int, kind: str, ids: Optional[List[int]] = None,
+                  with_ids: bool = False, positions: Optional[Tuple[int, int]] = None) -> List[dict]:
+    query = (select(StoredProduct.id, StoredProduct.title, StoredProduct.url, StoredProduct.price, StoredProduct.image,
+                    StoredProduct.handle, StoredProduct.vendor, StoredProduct.product_type, StoredProduct.tags)
+             .where(StoredProduct.brand_id == brand_id, StoredProduct.kind == kind)
+             .order_by(StoredProduct.position))
+    variant_query = (select(StoredVariant.product_id, StoredVariant.title, StoredVariant.sku, StoredVariant.price,
+                            StoredVariant.compare_at_price, StoredVariant.available)
+                     .join(StoredProduct, StoredProduct.id == StoredVariant.product_id)
+                     .where(StoredVariant.brand_id == brand_id, StoredProduct.kind == kind)
+                     .order_by(StoredVariant.product_id, StoredVariant.position))
+    if ids is not None:
+        query = query.where(StoredProduct.id.in_(ids))
+        variant_query = variant_query.where(StoredVariant.product_id.in_(ids))
+    if positions is not None:
+        # Positions are contiguous per brand and kind, so a page is an index range scan
+        start, stop = positions
+        query = query.where(StoredProduct.position >= start, StoredProduct.position < stop)
+        variant_query = variant_query.where(StoredProduct.position >= start, StoredProduct.position < stop)
+    rows = db.execute(query).tuples().all()
+    variants: Dict[int, List[dict]] = defaultdict(list)
+    if rows:
+        # Rows are unpacked as tuples; attribute lookups on Row add up over thousands of variants
+        for product_id, title, sku, price, compare_at_price, available in db.execute(variant_query).tuples():
+            variants[product_id].append({"title": title, "sku": sku, "price": price,
+                                         "compare_at_price": compare_at_price, "available": available})
+    return [{
+        **({"id": product_id} if with_ids else {}),
+        "title": title,
+        "url": url,
+        "price": price,
+        "image": image,
+        "handle": handle,
+        "vendor": vendor,
+        "product_type": product_type,
+        "tags": tags.split(',') if tags else [],
+        "variants": variants.get(product_id, []),
+    } for product_id, title, url, price, image, handle, vendor, product_type, tags in rows]
+
+def read_links(db: Session, brand_id: int, sections: List[str]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {section: {} for section in sections}
+    if 'contact_details' in result:
+        result['contact_details'] = {"emails": [], "phones": [], "contact_page": None}
+    rows = db.execute(
+        select(BrandLink.section, BrandLink.name, BrandLink.value)
+        .where(BrandLink.brand_id == brand_id, BrandLink.section.in_(sections))
+        .order_by(BrandLink.id)
+    )
+    for section, name, value in rows:
+        if section != 'contact_details':
+            result[section][name] = value
+        elif name in CONTACT_LISTS:
+            result[section][CONTACT_LISTS[name]].append(value)
+        else:
+            result[section][name] = value
+    return result
+
+def read_sections(db: Session, brand_id: int, sections: Iterable[str],
+                  catalog_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    # Only the tables behind the requested sections are queried
+    sections = [s for s in SECTION_NAMES if s in set(sections)]
+    result: Dict[str, Any] = {}
+    for section, kind in PRODUCT_SECTIONS.items():
+        if section in sections:
+            result[section] = read_products(db, brand_id, kind,
+                                            positions=catalog_range if section == 'product_catalog' else None)
+    texts = [s for s in sections if s in TEXT_SECTIONS]
+    if texts:
+        result.update({s: None for s in texts})
+        result.update(db.execute(
+            select(BrandText.section, BrandText.content)
+            .where(BrandText.brand_id == brand_id, BrandText.section.in_(texts))
+        ).tuples().all())
+    if 'faqs' in sections:
+        result['faqs'] = [{"question": q, "answer": a} for q, a in db.execute(
+            select(BrandFaq.question, BrandFaq.answer).where(BrandFaq.brand_id == brand_id).order_by(BrandFaq.position)
+        )]
+    links = [s for s in sections if s in LINK_SECTIONS]
+    if links:
+        result.update(read_links(db, brand_id, links))
+    return {s: result[s] for s in sections}
+
+def load_insights(db: Session, brand: Brand, sections: Optional[Iterable[str]] = None,
+                  catalog_range: Optional[Tuple[int, int]] = None) -> Optional[Dict[str, Any]]:
+    # catalog_range=(start, stop) limits product_catalog to those positions
+    sections = SECTION_NAMES if sections is None else list(sections)
+    if brand.scraped_at is not None:
+        return read_sections(db, brand.id, sections, catalog_range)
+    # Brands last scraped before the normalized tables existed still have a JSON blob
+    insight = db.query(BrandInsight).filter(BrandInsight.brand_id == brand.id).first()
+    if insight is None:
+        return None
+    data = json.loads(insight.insights_json)
+    if catalog_range is not None and data.get('product_catalog'):
+        data['product_catalog'] = data['product_catalog'][catalog_range[0]:catalog_range[1]]
+    return {s: data.get(s) for s in SECTION_NAMES if s in set(sections)}
+
+def list_brands(db: Session, after: Optional[int] = None, limit: int = 100, q: Optional[str] = None,
+                scraped_since: Optional[datetime] = None) -> List[dict]:
+    # Keyset pagination on the primary key
+    query = db.query(Brand.id, Brand.website_url, Brand.created_at, Brand.scraped_at, Brand.version)
+    if after is not None:
+        query = query.filter(Brand.id > after)
+    if q:
+        query = query.filter(Brand.website_url.contains(q, autoescape=True))
+    if scraped_since is not None:
+        if scraped_since.tzinfo is not None:
+            scraped_since = scraped_since.astimezone(timezone.utc)
+        query = query.filter(Brand.scraped_at >= scraped_since)
+    return [dict(row._mapping) for row in query.order_by(Brand.id).limit(limit)]
+
+def search_products(db: Session, q: Optional[str] = None, min_price: Optional[float] = None,
+                    max_price: Optional[float] = None, brand_id: Optional[int] = None,
+                    limit: int = 50, offset: int = 0) -> List[dict]:
+    query = (select(StoredProduct.brand_id, Brand.website_url, StoredProduct.title, StoredProduct.url,
+                    StoredProduct.price, StoredProduct.image, StoredProduct.handle)
+             .join(Brand, Brand.id == StoredProduct.brand_id)
+             .where(StoredProduct.kind == 'catalog', Brand.scraped_at.isnot(None)))
+    if min_price is not None:
+        query = query.where(StoredProduct.price >= min_price)
+    if max_price is not None:
+        query = query.where(StoredProduct.price <= max_price)
+    if brand_id is not None:
+        query = query.where(StoredProduct.brand_id == brand_id)
+    for term in (q or '').lower().split():
+        query = query.where(StoredProduct.search_text.contains(term, autoescape=True))
+    query = query.order_by(StoredProduct.price, StoredProduct.id).limit(limit).offset(offset)
+    return [dict(row._mapping) for row in db.execute(query)]
+
+def change_to_dict(change: BrandChange, website_url: Optional[str] = None) -> dict:
+    return {
+        "brand_id": change.brand_id,
+        **({"website_url": website_url} if website_url is not None else {}),
+        "version": change.version,
+        "section": change.section,
+        "key": change.key,
+        "change": change.change,
+        "old_value": json.loads(change.old_value) if change.old_value else None,
+        "new_value": json.loads(change.new_value) if change.new_value else None,
+        "created_at": change.created_at,
+    }
+
+def changes_since(db: Session, since: datetime, brand_id: Optional[int] = None, section: Optional[str] = None,
+                  limit: int = 500) -> List[dict]:
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc)
+    query = (db.query(BrandChange, Brand.website_url)
+             .join(Brand, Brand.id == BrandChange.brand_id)
+             .filter(BrandChange.created_at > since))
+    if brand_id is not None:
+        query = query.filter(BrandChange.brand_id == brand_id)
+    if section is not None:
+        query = query.filter(BrandChange.section == section)
+    rows = query.order_by(BrandChange.created_at, BrandChange.id).limit(limit).all()
+    return [change_to_dict(change, website_url) for change, website_url in rows]
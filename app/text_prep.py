@@ -0,0 +1,113 @@
+import os
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, List, Sequence
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", "3000"))
+LLM_MAX_CHUNKS = int(os.getenv("LLM_MAX_CHUNKS", "4"))
+
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'svg', 'meta', 'head', 'title', 'link', 'template',
+                    'iframe', 'form', 'button', 'select', 'nav', 'header', 'footer', 'aside']
+BOILERPLATE_ROLES = {'navigation', 'banner', 'contentinfo', 'dialog', 'search'}
+BOILERPLATE_CLASS = re.compile(r'announcement|cookie|drawer|mega-menu|newsletter|popup|modal|breadcrumb|cart-notification', re.I)
+
+# Lines that mention these get priority when a page has to be cut down to the budget
+TASK_KEYWORDS = {
+    'faqs': ['?', 'faq', 'question', 'answer', 'how', 'what', 'when', 'can i', 'do you', 'shipping', 'return'],
+    'contact': ['@', 'contact', 'email', 'phone', 'call', 'whatsapp', 'address', 'support', 'hours', '+'],
+    'about': ['about', 'story', 'founded', 'mission', 'we ', 'our ', 'brand', 'believe', 'since'],
+}
+
+def strip_boilerplate(soup: "BeautifulSoup", keep: Sequence[str] = ()) -> "BeautifulSoup":
+    # Mutates the tree; pass a copy of any cached soup
+    for tag in soup.find_all([t for t in BOILERPLATE_TAGS if t not in keep]):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in keep:
+            continue
+        attrs = tag.attrs or {}
+        classes = ' '.join(attrs.get('class', [])) + ' ' + (attrs.get('id') or '')
+        if attrs.get('role') in BOILERPLATE_ROLES or BOILERPLATE_CLASS.search(classes):
+            tag.decompose()
+    return soup
+
+def page_text(soup: "BeautifulSoup", keep: Sequence[str] = ()) -> str:
+    strip_boilerplate(soup, keep=keep)
+    return dedupe_lines(soup.get_text(separator='\n', strip=True))
+
+def dedupe_lines(text: str) -> str:
+    # Menus and repeated widgets produce the same short lines many times over
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        line = re.sub(r'\s+', ' ', line).strip()
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return '\n'.join(lines)
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English text
+    return (len(text) + 3) // 4
+
+def select_relevant(text: str, keywords: Iterable[str], budget: int) -> str:
+    if count_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    keywords = [kw.lower() for kw in keywords]
+    scored = []
+    for i, line in enumerate(lines):
+        lower = line.lower()
+        score = sum(1 for kw in keywords if kw in lower) + min(len(line), 200) / 200
+        scored.append((score, i))
+    chosen = set()
+    used = 0
+    for score, i in sorted(scored, key=lambda item: (-item[0], item[1])):
+        cost = count_tokens(lines[i]) + 1
+        if used + cost > budget:
+            continue
+        chosen.add(i)
+        used += cost
+    return '\n'.join(lines[i] for i in sorted(chosen))
+
+def chunk_text(text: str, budget: int) -> List[str]:
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for line in text.splitlines():
+        cost = count_tokens(line) + 1
+        if current and used + cost > budget:
+            chunks.append('\n'.join(current))
+            current, used = [], 0
+        if cost > budget:
+            # A single huge line (minified markup, long paragraphs) is cut by characters
+            step = budget * 4
+            chunks.extend(line[i:i + step] for i in range(0, len(line), step))
+            continue
+        current.append(line)
+        used += cost
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+def prepare_llm_input(kind: str, text: str, budget: int = LLM_INPUT_TOKEN_BUDGET,
+                      max_chunks: int = LLM_MAX_CHUNKS) -> List[str]:
+    # Keeps the most relevant lines within max_chunks * budget tokens, split into budget-sized chunks
+    text = dedupe_lines(text)
+    text = select_relevant(text, TASK_KEYWORDS.get(kind, []), budget * max_chunks)
+    return chunk_text(text, budget)[:max_chunks] or ['']
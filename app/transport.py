@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app import metrics
+from app.http_cache import HTTPCache, get_http_cache
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = float(os.getenv("SCRAPER_REQUEST_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("SCRAPER_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SCRAPER_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("SCRAPER_KEEPALIVE_EXPIRY", "30"))
+MAX_CONCURRENCY_PER_HOST = int(os.getenv("SCRAPER_MAX_CONCURRENCY_PER_HOST", "6"))
+HOST_RATE_PER_SECOND = float(os.getenv("SCRAPER_HOST_RATE_PER_SECOND", "10"))
+HOST_BURST = int(os.getenv("SCRAPER_HOST_BURST", "20"))
+MAX_RETRIES = int(os.getenv("SCRAPER_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("SCRAPER_BACKOFF_BASE", "0.5"))
+MAX_BACKOFF = float(os.getenv("SCRAPER_MAX_BACKOFF", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Errors on a connection that was up, such as a keep-alive connection the server closed, are retried.
+# Timeouts are not: a hanging store would cost a full timeout per attempt. A refused connection gets one retry.
+RETRY_ERRORS = (httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError)
+MAX_CONNECT_RETRIES = 1
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class Transport:
+    """Pooled keep-alive HTTP client shared by every ShopifyScraper in the process."""
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, max_retries: int = MAX_RETRIES,
+                 rate: float = HOST_RATE_PER_SECOND, burst: int = HOST_BURST,
+                 max_concurrency_per_host: int = MAX_CONCURRENCY_PER_HOST,
+                 cache: Optional[HTTPCache] = None):
+        # httpx advertises gzip/deflate (and br/zstd when installed) and decodes transparently
+        self.client = client or httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.max_retries = max_retries
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.cache = cache
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.loop = asyncio.get_running_loop()
+
+    def _host(self, url: str) -> str:
+        host = urlsplit(url).netloc.lower()
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+            self._semaphores[host] = asyncio.Semaphore(self.max_concurrency_per_host)
+        return host
+
+    def _backoff(self, attempt: int, resp: Optional[httpx.Response]) -> float:
+        delay = retry_after_seconds(resp) if resp is not None else None
+        if delay is None:
+            delay = BACKOFF_BASE * (2 ** attempt) * (1 + random.random())
+        return min(delay, MAX_BACKOFF)
+
+    async def get(self, url: str) -> httpx.Response:
+        stage = metrics.stage.get()
+        start = time.perf_counter()
+        cache_state = "off"
+        status = "error"
+        resp = None
+        try:
+            if self.cache is None:
+                resp = await self._send(url)
+            else:
+                cached = await asyncio.to_thread(self.cache.get, url)
+                cache_state = "miss" if cached is None else "stale"
+                resp = await self._send(url, cached.validators() if cached else None)
+                if cached is not None and resp.status_code == 304:
+                    cache_state = "revalidated"
+                    await asyncio.to_thread(self.cache.revalidated, url, resp)
+                    resp = cached.to_response()
+                elif resp.status_code == 200:
+                    await asyncio.to_thread(self.cache.put, url, resp)
+            status = str(resp.status_code)
+            return resp
+        finally:
+            elapsed = time.perf_counter() - start
+            size = len(resp.content) if resp is not None else 0
+            metrics.inc("http_requests_total", stage=stage, status=status, cache=cache_state)
+            metrics.observe("http_request_seconds", elapsed, stage=stage)
+            metrics.inc("http_response_bytes_total", size, stage=stage)
+            metrics.record_stage(stage, requests=1, bytes=size)
+
+    async def _send(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        host = self._host(url)
+        attempt = 0
+        connect_retries = 0
+        while True:
+            resp = None
+            try:
+                async with self._semaphores[host]:
+                    await self._buckets[host].acquire()
+                    resp = await self.client.get(url, headers=headers)
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return resp
+                reason = str(resp.status_code)
+            except httpx.TransportError as e:
+                if isinstance(e, httpx.ConnectError) and connect_retries < MAX_CONNECT_RETRIES:
+                    connect_retries += 1
+                elif not isinstance(e, RETRY_ERRORS):
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                logger.debug("GET %s failed: %s", url, e)
+                reason = type(e).__name__
+            delay = self._backoff(attempt, resp)
+            logger.info("Retrying GET %s in %.2fs (attempt %d)", url, delay, attempt + 1)
+            metrics.inc("http_retries_total", stage=metrics.stage.get(), reason=reason)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+_transport: Optional[Transport] = None
+
+def get_transport() -> Transport:
+    global _transport
+    # The pool is bound to the event loop it was created on
+    loop = asyncio.get_running_loop()
+    if _transport is not None and _transport.loop is not loop:
+        if _transport.loop.is_running():
+            asyncio.run_coroutine_threadsafe(_transport.aclose(), _transport.loop)
+        else:
+            # Its loop has ended, so the pool can no longer be closed; close_transport() before the loop ends
+            logger.warning("Replacing an HTTP transport that was not closed before its event loop ended")
+        _transport = None
+    if _transport is None:
+        _transport = Transport(cache=get_http_cache())
+    return _transport
+
+async def close_transport() -> None:
+    global _transport
+    if _transport is not None:
+        await _transport.aclose()
+        _transport = None
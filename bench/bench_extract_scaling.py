@@ -0,0 +1,92 @@
+"""Extraction throughput on the recorded store pages, on the event loop and across worker-process counts.
+
+Run from the repository root: python -m bench.bench_extract_scaling [--rounds N] [--workers 1 2 4]
+Prints one JSON object per configuration: pages per second, speedup over the event loop run, and the
+longest event-loop stall seen while the batch ran (how long a request would have waited to be served).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from app import extract
+from bench import corpus
+
+BASE_URL = "https://store.example"
+TICK = 0.005
+
+
+def workload(rounds: int) -> list:
+    # The extraction each recorded page gets during a scrape
+    jobs = []
+    for name in corpus.store_names():
+        for path, html in corpus.documents(name).items():
+            if path == "/":
+                jobs.append((extract.homepage, html, BASE_URL))
+            elif any(kw in path for kw in ("faq", "help")):
+                jobs.append((extract.faqs, html))
+            elif any(kw in path for kw in ("contact", "touch")):
+                jobs.append((extract.contact_page, html))
+            else:
+                jobs.append((extract.main_text, html))
+    return jobs * rounds
+
+
+async def run_batch(jobs: list) -> dict:
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            stall = max(stall, time.perf_counter() - start - TICK)
+
+    watcher = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    if extract.EXTRACT_WORKERS <= 0:
+        # The event loop handles one page at a time, with a chance to serve other tasks in between
+        for fn, *args in jobs:
+            await extract.run(fn, *args)
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*(extract.run(fn, *args) for fn, *args in jobs))
+    elapsed = time.perf_counter() - start
+    done = True
+    await watcher
+    return {"seconds": round(elapsed, 3), "pages_per_second": round(len(jobs) / elapsed, 1),
+            "max_loop_stall_ms": round(stall * 1000, 1)}
+
+
+def measure(workers: int, jobs: list) -> dict:
+    extract.EXTRACT_WORKERS = workers
+    extract.start_pool()
+    try:
+        return {"workers": workers, **asyncio.run(run_batch(jobs))}
+    finally:
+        extract.shutdown_pool()
+
+
+def main() -> int:
+    cpus = os.cpu_count() or 1
+    defaults = sorted({n for n in (1, 2, 4, 8, 16, cpus) if n <= cpus})
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=10, help="times the recorded pages are repeated")
+    parser.add_argument("--workers", type=int, nargs="*", default=defaults, help="pool sizes to measure")
+    args = parser.parse_args()
+    jobs = workload(args.rounds)
+    inline = measure(0, jobs)
+    print(json.dumps({"cpus": cpus, "pages": len(jobs), **inline}))
+    for workers in args.workers:
+        result = measure(workers, jobs)
+        result["speedup"] = round(inline["seconds"] / result["seconds"], 2)
+        print(json.dumps({"cpus": cpus, "pages": len(jobs), **result}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
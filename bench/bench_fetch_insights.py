@@ -0,0 +1,225 @@
+"""End-to-end /fetch-insights benchmark over the recorded store corpus in fixtures/stores.
+
+Run from the repository root: python -m bench.bench_fetch_insights [--latency S] [--repeat N]
+                                  [--output FILE] [--baseline FILE]
+Each store is served by its own StubServer (plus a fake OpenAI endpoint) in a child process, so the
+CPU numbers only cover the app. Prints one JSON report; with --baseline it exits 1 when a store makes
+more requests than before, or its latency or peak memory grows past --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The app reads its settings at import time; every run starts with an empty database and no caches.
+# Extraction worker processes re-import this module and inherit the parent's database.
+_workdir = None
+if "DATABASE_URL" not in os.environ:
+    _workdir = tempfile.mkdtemp(prefix="bench-fetch-insights-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/bench.db"
+os.environ.setdefault("HTTP_CACHE_ENABLED", "0")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+from app import metrics
+from app.db import init_db
+from app.extract import EXTRACT_WORKERS
+from app.main import app
+from app.parsing import classify_links, make_soup
+from app.pipeline import build_products
+from app.text_prep import page_text
+from app.transport import HOST_BURST, HOST_RATE_PER_SECOND, close_transport
+from bench import corpus
+from bench.fake_openai import FakeOpenAI, routes as openai_routes
+from bench.stub_server import StubServer
+
+PRODUCTS_PAGE = 250
+
+
+def serve(stores, latency: float, llm_delay: float, conn) -> None:
+    servers = {name: StubServer(corpus.load_store(name), latency=latency) for name in stores}
+    servers["openai"] = StubServer(openai_routes(FakeOpenAI(delay=llm_delay)))
+    for server in servers.values():
+        server.__enter__()
+    conn.send({name: server.url for name, server in servers.items()})
+    conn.recv()
+    for server in servers.values():
+        server.__exit__(None, None, None)
+
+
+def counter_total(snapshot, name: str, by: str = None):
+    series = snapshot.get(name, {})
+    if by is None:
+        return int(sum(series.values()))
+    totals = {}
+    for key, value in series.items():
+        label = dict(key).get(by, "")
+        totals[label] = totals.get(label, 0) + int(value)
+    return dict(sorted(totals.items()))
+
+
+async def fetch(client: httpx.AsyncClient, url: str) -> dict:
+    metrics.reset()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    response = await client.post("/fetch-insights", json={"website_url": url, "force_refresh": True})
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    response.raise_for_status()
+    counters = metrics.snapshot()
+    body = response.json()
+    return {
+        "latency_ms": elapsed * 1000,
+        "cpu_ms": cpu * 1000,
+        "requests": counter_total(counters, "http_requests_total"),
+        "requests_by_stage": counter_total(counters, "http_requests_total", by="stage"),
+        "llm_requests": counter_total(counters, "llm_requests_total"),
+        "products": len(body["product_catalog"]),
+        "response_bytes": len(response.content),
+    }
+
+
+def parse_cpu_ms(name: str, base_url: str, repeat: int) -> float:
+    # CPU to parse every document of a store once: the homepage link pass, page text and the catalog pages
+    pages = corpus.documents(name)
+    products = corpus.catalog(name)
+    catalog_pages = [json.dumps({"products": products[i:i + PRODUCTS_PAGE]}) for i in range(0, len(products), PRODUCTS_PAGE)]
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        for path, html in pages.items():
+            soup = make_soup(html)
+            if path == "/":
+                classify_links(soup, base_url)
+            else:
+                page_text(soup)
+        for page in catalog_pages:
+            build_products(json.loads(page)["products"], base_url)
+        samples.append((time.process_time() - start) * 1000)
+    return statistics.median(samples)
+
+
+def summarize(runs: list, parse_ms: float, peak_bytes: int) -> dict:
+    latencies = sorted(run["latency_ms"] for run in runs)
+    last = runs[-1]
+    return {
+        "latency_ms": {
+            "median": round(statistics.median(latencies), 1),
+            "p90": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))], 1),
+            "min": round(latencies[0], 1),
+        },
+        "cpu_ms": round(statistics.median(run["cpu_ms"] for run in runs), 1),
+        "parse_cpu_ms": round(parse_ms, 1),
+        "peak_memory_kb": peak_bytes // 1024,
+        # Request counts are deterministic for a fixed corpus; any change shows up run to run
+        "requests": last["requests"],
+        "requests_by_stage": last["requests_by_stage"],
+        "llm_requests": last["llm_requests"],
+        "products": last["products"],
+        "response_bytes": last["response_bytes"],
+    }
+
+
+async def run_benchmark(urls: dict, stores: list, repeat: int) -> dict:
+    results = {}
+    # ASGITransport does not run the app's lifespan
+    await asyncio.to_thread(init_db)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name in stores:
+            # The first scrape inserts the brand; the measured ones take the re-scrape path
+            await fetch(client, urls[name])
+            runs = [await fetch(client, urls[name]) for _ in range(repeat)]
+            tracemalloc.start()
+            await fetch(client, urls[name])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = summarize(runs, parse_cpu_ms(name, urls[name], repeat), peak)
+    await close_transport()
+    return results
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for name, current in report["stores"].items():
+        before = baseline.get("stores", {}).get(name)
+        if before is None:
+            continue
+        if current["requests"] > before["requests"]:
+            found.append(f"{name}: requests {before['requests']} -> {current['requests']}")
+        if current["llm_requests"] > before["llm_requests"]:
+            found.append(f"{name}: llm_requests {before['llm_requests']} -> {current['llm_requests']}")
+        for metric in ("latency_ms", "peak_memory_kb"):
+            old = before[metric]["median"] if metric == "latency_ms" else before[metric]
+            new = current[metric]["median"] if metric == "latency_ms" else current[metric]
+            if old and new > old * (1 + tolerance):
+                found.append(f"{name}: {metric} {old} -> {new}")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", nargs="*", default=None, help="store fixtures to run (default: all)")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub waits before each response")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="seconds the fake OpenAI waits per completion")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth in latency and memory")
+    args = parser.parse_args()
+    stores = args.stores or corpus.store_names()
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(stores, args.latency, args.llm_delay, child), daemon=True)
+    server.start()
+    urls = parent.recv()
+    os.environ["OPENAI_BASE_URL"] = urls["openai"] + "/v1"
+    try:
+        results = asyncio.run(run_benchmark(urls, stores, args.repeat))
+    finally:
+        parent.send("stop")
+        server.join(5)
+        if _workdir:
+            shutil.rmtree(_workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "llm_delay": args.llm_delay,
+            "repeat": args.repeat,
+            "host_rate_per_second": HOST_RATE_PER_SECOND,
+            "host_burst": HOST_BURST,
+            "extract_workers": EXTRACT_WORKERS,
+        },
+        "stores": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
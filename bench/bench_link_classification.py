@@ -0,0 +1,167 @@
+"""Compares the original per-extractor homepage walks with the single classify_links() pass.
+
+Run from the repository root: python -m bench.bench_link_classification [--repeat N] [--mega-menu N]
+Prints one JSON object per fixture with the median time in milliseconds. Each fixture is also run as a
+mega-menu page with its anchors repeated --mega-menu times, and the page text goes through the contact
+scan with and without the phone-candidate pre-filter.
+"""
+import argparse
+import json
+import pathlib
+import re
+import statistics
+import time
+
+import phonenumbers
+from bs4 import BeautifulSoup
+
+from app.extract import PHONE_REGION, find_contacts, visible_text
+from app.parsing import (ABOUT_KEYWORDS, CONTACT_KEYWORDS, HTML_PARSER, IMPORTANT_LINK_KEYWORDS, POLICY_KEYWORDS,
+                         SOCIAL_DOMAINS, absolute_url, classify_links, make_soup)
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+BASE_URL = "https://evergreen-goods.example"
+
+
+# The walks below mirror what each ShopifyScraper extractor did before the single pass
+def hero_walk(soup):
+    hero_products = []
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        if '/products/' in href:
+            img = a.find('img')
+            hero_products.append({'title': a.get_text(strip=True), 'url': absolute_url(BASE_URL, href),
+                                  'image': img['src'] if img and img.has_attr('src') else None})
+    return hero_products
+
+
+def policy_walk(soup, keywords):
+    return [absolute_url(BASE_URL, a['href'].lower()) for a in soup.find_all('a', href=True)
+            if any(kw in a['href'].lower() for kw in keywords)]
+
+
+def faq_walk(soup):
+    return [absolute_url(BASE_URL, a['href']) for a in soup.find_all('a', href=True)]
+
+
+def social_walk(soup):
+    handles = {}
+    for a in soup.find_all('a', href=True):
+        for platform, domain in SOCIAL_DOMAINS.items():
+            if domain in a['href']:
+                handles[platform] = a['href']
+    return handles
+
+
+def first_link_walk(soup, keywords):
+    for a in soup.find_all('a', href=True):
+        href = a['href'].lower()
+        if any(kw in href for kw in keywords):
+            return absolute_url(BASE_URL, href)
+    return None
+
+
+def important_walk(soup):
+    links = {}
+    for a in soup.find_all('a', href=True):
+        text = a.get_text(strip=True).lower()
+        href = a['href']
+        for key, kw_list in IMPORTANT_LINK_KEYWORDS.items():
+            if any(kw in text or kw in href.lower() for kw in kw_list) and key not in links:
+                links[key] = absolute_url(BASE_URL, href)
+    return links
+
+
+def per_extractor(soup):
+    hero_walk(soup)
+    policy_walk(soup, ['privacy'])
+    policy_walk(soup, ['refund', 'return', 'exchange'])
+    faq_walk(soup)
+    social_walk(soup)
+    first_link_walk(soup, ['contact', 'support', 'customer-service'])
+    first_link_walk(soup, ['about', 'story'])
+    important_walk(soup)
+
+
+# The single pass as it was before the precompiled matcher: every keyword list tested with `in` per anchor
+def keyword_loop(soup):
+    social_handles, important_links, policy_links = {}, {}, {policy: [] for policy in POLICY_KEYWORDS}
+    contact_url = about_url = None
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        href_lower = href.lower()
+        text_lower = a.get_text(strip=True).lower()
+        if '/products/' in href:
+            a.find('img')
+        for platform, domain in SOCIAL_DOMAINS.items():
+            if domain in href:
+                social_handles[platform] = href
+        for key, kw_list in IMPORTANT_LINK_KEYWORDS.items():
+            if key not in important_links and any(kw in text_lower or kw in href_lower for kw in kw_list):
+                important_links[key] = absolute_url(BASE_URL, href)
+        for policy, kw_list in POLICY_KEYWORDS.items():
+            if any(kw in href_lower for kw in kw_list):
+                policy_links[policy].append(absolute_url(BASE_URL, href_lower))
+        if contact_url is None and any(kw in href_lower for kw in CONTACT_KEYWORDS):
+            contact_url = absolute_url(BASE_URL, href_lower)
+        if about_url is None and any(kw in href_lower for kw in ABOUT_KEYWORDS):
+            about_url = absolute_url(BASE_URL, href_lower)
+
+
+def full_contact_scan(text):
+    emails = re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", text)
+    phones = [phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.E164)
+              for match in phonenumbers.PhoneNumberMatcher(text, PHONE_REGION)]
+    return emails, phones
+
+
+def mega_menu(html, copies):
+    # The page with every anchor repeated inside one extra <nav>
+    anchors = ''.join(str(a) for a in make_soup(html).find_all('a', href=True))
+    return html.replace('</body>', f'<nav>{anchors * copies}</nav></body>', 1)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mega-menu", type=int, default=20, help="times the anchors are repeated in the mega-menu run")
+    args = parser.parse_args()
+    for path in sorted(FIXTURES.glob("*homepage*.html")):
+        html = path.read_text()
+        soup_builtin = BeautifulSoup(html, 'html.parser')
+        soup_fast = make_soup(html)
+        results = {
+            "fixture": path.name,
+            "links": len(soup_fast.find_all('a', href=True)),
+            "parser": HTML_PARSER,
+            "parse_html_parser_ms": timed(lambda: BeautifulSoup(html, 'html.parser'), args.repeat),
+            "parse_default_ms": timed(lambda: make_soup(html), args.repeat),
+            "per_extractor_walks_ms": timed(lambda: per_extractor(soup_builtin), args.repeat),
+            "single_pass_ms": timed(lambda: classify_links(soup_fast, BASE_URL), args.repeat),
+            # Parse plus link extraction, before and after
+            "baseline_total_ms": timed(lambda: per_extractor(BeautifulSoup(html, 'html.parser')), args.repeat),
+            "optimized_total_ms": timed(lambda: classify_links(make_soup(html), BASE_URL), args.repeat),
+        }
+        mega_soup = make_soup(mega_menu(html, args.mega_menu))
+        text = visible_text(make_soup(html))
+        results.update({
+            "mega_menu_links": len(mega_soup.find_all('a', href=True)),
+            "mega_menu_keyword_loop_ms": timed(lambda: keyword_loop(mega_soup), args.repeat),
+            "mega_menu_single_pass_ms": timed(lambda: classify_links(mega_soup, BASE_URL), args.repeat),
+            "contacts_full_scan_ms": timed(lambda: full_contact_scan(text), args.repeat),
+            "contacts_prefiltered_ms": timed(lambda: find_contacts(text), args.repeat),
+        })
+        print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
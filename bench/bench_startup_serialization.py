@@ -0,0 +1,171 @@
+"""Service startup time and the cost of serving and storing a large catalog.
+
+Run from the repository root: python -m bench.bench_startup_serialization [--products N] [--variants N]
+                                  [--repeat N]
+Startup is measured in fresh interpreters: importing app.main (and which heavy dependencies that pulls
+in), then init_db on an empty database. The catalog part stores a synthetic brand with --products
+products and times the write, a cached /fetch-insights hit, /brands/{id}/insights and the streamed
+catalog event, next to the serialization paths those endpoints used before. Prints one JSON report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_workdir = tempfile.mkdtemp(prefix="bench-startup-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/bench.db"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+from app.db import init_db, run_db
+from app.main import app, stream_event
+from app.models import BrandInsights
+from app.pipeline import stored_payload, upsert_insights
+
+HEAVY_MODULES = ("openai", "phonenumbers", "bs4", "dotenv", "lxml.etree")
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+INIT_SCRIPT = """
+import json, time
+from app.db import init_db
+start = time.perf_counter()
+init_db()
+print(json.dumps({"init_db_ms": (time.perf_counter() - start) * 1000}))
+"""
+URL = "https://large-catalog.example"
+
+
+def run_python(script: str, database_url: str) -> dict:
+    env = {**os.environ, "DATABASE_URL": database_url}
+    out = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def startup(repeat: int) -> dict:
+    imports = []
+    inits = []
+    for i in range(repeat):
+        database_url = f"sqlite:///{_workdir}/startup-{i}.db"
+        imports.append(run_python(IMPORT_SCRIPT, database_url))
+        inits.append(run_python(INIT_SCRIPT, database_url)["init_db_ms"])
+    return {
+        "import_app_main_ms": round(statistics.median(run["import_ms"] for run in imports), 1),
+        "heavy_modules_loaded": imports[-1]["loaded"],
+        "init_db_ms": round(statistics.median(inits), 1),
+    }
+
+
+def large_insights(products: int, variants: int) -> BrandInsights:
+    catalog = [{
+        "title": f"Merino Crew {i}",
+        "url": f"{URL}/products/merino-crew-{i}",
+        "price": 49.0 + i % 50,
+        "image": f"https://cdn.example/files/merino-{i}.jpg",
+        "handle": f"merino-crew-{i}",
+        "vendor": "Evergreen",
+        "product_type": "Sweaters",
+        "tags": ["merino", "winter", f"batch-{i % 20}"],
+        "variants": [{"title": size, "sku": f"MC-{i}-{size}", "price": 49.0 + i % 50, "compare_at_price": None,
+                      "available": n % 2 == 0} for n, size in enumerate(["XS", "S", "M", "L", "XL", "XXL"][:variants])],
+    } for i in range(products)]
+    return BrandInsights(
+        product_catalog=catalog,
+        hero_products=catalog[:8],
+        privacy_policy="We respect your privacy. " * 200,
+        refund_policy="Returns are accepted within 30 days. " * 100,
+        faqs=[{"question": f"Question {i}?", "answer": f"Answer {i}."} for i in range(25)],
+        social_handles={"instagram": "https://instagram.com/evergreen"},
+        contact_details={"emails": ["hello@evergreen.example"], "phones": ["+919876543210"], "contact_page": None},
+        about="Evergreen makes knitwear. " * 40,
+        important_links={"faq": f"{URL}/pages/faq"},
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+async def timed_async(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+async def catalog(products: int, variants: int, repeat: int) -> dict:
+    init_db()
+    insights = large_insights(products, variants)
+    start = time.perf_counter()
+    brand_id = await run_db(upsert_insights, URL, insights, write=True)
+    first_write = (time.perf_counter() - start) * 1000
+    rewrite = await timed_async(lambda: run_db(upsert_insights, URL, insights, write=True), repeat)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def cached_hit():
+            response = await client.post("/fetch-insights", json={"website_url": URL})
+            assert response.headers["X-Cache"] == "HIT"
+            results["cached_hit_bytes"] = len(response.content)
+
+        async def brand_insights():
+            response = await client.get(f"/brands/{brand_id}/insights", params={"catalog_limit": products})
+            response.raise_for_status()
+
+        results["cached_hit_ms"] = await timed_async(cached_hit, repeat)
+        results["brand_insights_ms"] = await timed_async(brand_insights, repeat)
+
+    stored, _ = await run_db(stored_payload, URL)
+    section = {"section": "product_catalog", "data": insights.product_catalog}
+    return {
+        "products": products,
+        "variants_per_product": variants,
+        "first_write_ms": round(first_write, 1),
+        "rewrite_unchanged_ms": rewrite,
+        **results,
+        # The same payloads through the paths the endpoints took before
+        "validate_and_dump_stored_ms": timed(lambda: BrandInsights(**stored).model_dump_json(), repeat),
+        "jsonable_encoder_stored_ms": timed(lambda: json.dumps(jsonable_encoder(stored)), repeat),
+        "stream_catalog_event_ms": timed(lambda: stream_event("section", section, False), repeat),
+        "jsonable_encoder_catalog_event_ms": timed(
+            lambda: json.dumps(jsonable_encoder({"event": "section", **section})), repeat),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--variants", type=int, default=3, help="variants per product, at most 6")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    try:
+        report = {"startup": startup(args.repeat),
+                  "catalog": asyncio.run(catalog(args.products, args.variants, args.repeat))}
+    finally:
+        shutil.rmtree(_workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
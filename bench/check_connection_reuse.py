@@ -0,0 +1,54 @@
+"""Scrapes a stub store twice through the shared transport and checks that TCP connections are reused.
+
+Run from the repository root: python -m bench.check_connection_reuse
+"""
+import asyncio
+import json
+import sys
+
+from app.scraper import ShopifyScraper
+from app.transport import close_transport
+from bench.stub_server import StubServer
+
+HOMEPAGE = """<html><body><main>
+<a href="/products/tee"><img src="/tee.jpg">Tee</a>
+<a href="/policies/privacy-policy">Privacy</a><a href="/pages/contact">Contact</a>
+<a href="https://instagram.com/stub">Instagram</a>
+</main></body></html>"""
+POLICY = "<html><body><main>" + "Policy text. " * 20 + "</main></body></html>"
+
+
+def products(target: str, headers, body):
+    page = 1 if "page=1" in target or "page=" not in target else 2
+    items = [{"title": "Tee", "handle": "tee", "variants": [{"price": "10.00"}], "images": []}] if page == 1 else []
+    return 200, {"Content-Type": "application/json"}, json.dumps({"products": items}).encode()
+
+
+async def scrape_twice(url: str) -> None:
+    for _ in range(2):
+        scraper = ShopifyScraper(url)
+        await asyncio.gather(
+            scraper.get_product_catalog(),
+            scraper.get_privacy_policy(),
+            scraper.get_refund_policy(),
+            scraper.get_faqs(),
+            scraper.get_important_links(),
+        )
+    await close_transport()
+
+
+def main() -> int:
+    routes = {"/": HOMEPAGE, "/products.json": products, "/policies/privacy-policy": POLICY,
+              "/pages/contact": "<html><body>hello@stub.example</body></html>"}
+    with StubServer(routes) as stub:
+        asyncio.run(scrape_twice(stub.url))
+        total_requests = sum(stub.requests.values())
+        print(json.dumps({"requests": total_requests, "connections": stub.connections}))
+        if stub.connections >= total_requests:
+            print("FAIL: every request opened a new connection", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
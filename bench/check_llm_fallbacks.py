@@ -0,0 +1,94 @@
+"""Runs the FAQ, contact and about LLM fallbacks against FakeOpenAI and checks the cache and combined call.
+
+Run from the repository root: python -m bench.check_llm_fallbacks
+A stub store without structured FAQs, contact details or an about page is scraped twice; the second
+scrape must be answered from the LLM cache without any prompt. A second store, scraped with combined
+fallbacks (LLM_COMBINE_FALLBACKS=1), must send all three as one prompt.
+"""
+import os
+import tempfile
+
+# Every run starts with an empty LLM cache. Extraction worker processes re-import this module and
+# inherit the parent's cache path.
+_workdir = None
+if __name__ == "__main__":
+    _workdir = tempfile.mkdtemp(prefix="check-llm-")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(_workdir, "llm_cache.db")
+os.environ["LLM_CACHE_ENABLED"] = "1"
+os.environ["HTTP_CACHE_ENABLED"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "check")
+
+import asyncio
+import json
+import shutil
+import sys
+
+from app import llm
+from app.scraper import ShopifyScraper
+from app.transport import close_transport
+from bench.fake_openai import ABOUT_REPLY, CONTACT_REPLY, FAQ_REPLY, FakeOpenAI, routes as openai_routes
+from bench.stub_server import StubServer
+
+
+def store(name: str) -> dict:
+    # No FAQ markup, no email or phone anywhere and no about page, so every section falls back to the LLM
+    homepage = (f"<html><body><main><h1>{name}</h1><p>{name} sells handmade goods to people everywhere.</p>"
+                f'<a href="/pages/faq">FAQ</a><a href="/pages/contact">Contact</a></main></body></html>')
+    faq = f"<html><body><main><div>Common questions. Shipping takes a week. Returns are free at {name}.</div></main></body></html>"
+    contact = f"<html><body><main><div>Write to the {name} team using the form.</div></main></body></html>"
+    return {"/": homepage, "/pages/faq": faq, "/pages/contact": contact}
+
+
+async def fallbacks(url: str, combine: bool) -> dict:
+    scraper = ShopifyScraper(url, combine_llm_fallbacks=combine)
+    faqs, contact, about = await asyncio.gather(scraper.get_faqs(), scraper.get_contact_details(), scraper.get_about())
+    return {"faqs": faqs, "emails": contact["emails"], "phones": contact["phones"], "about": about}
+
+
+async def run_checks(fake: FakeOpenAI, separate_url: str, combined_url: str) -> list:
+    failures = []
+    expected = {"faqs": FAQ_REPLY, "emails": CONTACT_REPLY["emails"], "phones": CONTACT_REPLY["phones"],
+                "about": ABOUT_REPLY}
+
+    first = await fallbacks(separate_url, combine=False)
+    first_prompts = len(fake.prompts)
+    second = await fallbacks(separate_url, combine=False)
+    second_prompts = len(fake.prompts) - first_prompts
+    if first != expected:
+        failures.append(f"separate fallbacks returned {json.dumps(first)}")
+    if first_prompts < 3:
+        failures.append(f"first scrape sent {first_prompts} prompts, expected one per fallback")
+    if second != first:
+        failures.append("cached scrape returned different sections")
+    if second_prompts:
+        failures.append(f"cached scrape sent {second_prompts} prompts")
+
+    before = len(fake.prompts)
+    combined = await fallbacks(combined_url, combine=True)
+    combined_prompts = fake.prompts[before:]
+    if combined != expected:
+        failures.append(f"combined fallbacks returned {json.dumps(combined)}")
+    if len(combined_prompts) != 1 or not combined_prompts[0].startswith(llm.COMBINED_INSTRUCTION):
+        failures.append(f"combined fallbacks sent {len(combined_prompts)} prompts, expected one combined prompt")
+    await close_transport()
+    print(json.dumps({"first_prompts": first_prompts, "cached_prompts": second_prompts,
+                      "combined_prompts": len(combined_prompts)}))
+    return failures
+
+
+def main() -> int:
+    fake = FakeOpenAI()
+    try:
+        with StubServer(openai_routes(fake)) as openai_stub, StubServer(store("Alder")) as separate, \
+                StubServer(store("Birch")) as combined:
+            os.environ["OPENAI_BASE_URL"] = openai_stub.url + "/v1"
+            failures = asyncio.run(run_checks(fake, separate.url, combined.url))
+    finally:
+        shutil.rmtree(_workdir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
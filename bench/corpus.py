@@ -0,0 +1,67 @@
+"""Recorded store responses under fixtures/stores, replayed through StubServer.
+
+Each store directory has a store.json manifest that maps request paths to files, and a products.json
+with the store's catalog. The catalog is served page by page, like Shopify's /products.json.
+"""
+import copy
+import json
+import pathlib
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from bench.stub_server import Route
+
+STORES = pathlib.Path(__file__).parent / "fixtures" / "stores"
+SHOPIFY_DEFAULT_LIMIT = 30
+SHOPIFY_MAX_LIMIT = 250
+
+
+def store_names() -> List[str]:
+    return sorted(path.parent.name for path in STORES.glob("*/store.json"))
+
+
+def manifest(name: str) -> dict:
+    return json.loads((STORES / name / "store.json").read_text())
+
+
+def catalog(name: str) -> List[dict]:
+    # products_repeat scales a small recorded catalog up; copies get their own ids and handles
+    info = manifest(name)
+    recorded = json.loads((STORES / name / info.get("products", "products.json")).read_text())["products"]
+    products = []
+    for n in range(info.get("products_repeat", 1)):
+        for product in recorded:
+            product = copy.deepcopy(product) if n else product
+            if n:
+                product["id"] = product["id"] + n * 1_000_000
+                product["handle"] = f"{product['handle']}-{n}"
+            products.append(product)
+    return products
+
+
+def products_route(products: List[dict]) -> Route:
+    pages: Dict[tuple, bytes] = {}
+
+    def respond(target: str, headers: Dict[str, str], body: bytes):
+        query = parse_qs(urlsplit(target).query)
+        limit = min(int(query.get("limit", [SHOPIFY_DEFAULT_LIMIT])[0]), SHOPIFY_MAX_LIMIT)
+        page = max(int(query.get("page", ["1"])[0]), 1)
+        if (limit, page) not in pages:
+            pages[limit, page] = json.dumps({"products": products[(page - 1) * limit:page * limit]}).encode()
+        return 200, {"Content-Type": "application/json"}, pages[limit, page]
+
+    return respond
+
+
+def load_store(name: str) -> Dict[str, Route]:
+    directory = STORES / name
+    routes: Dict[str, Route] = {path: (directory / file).read_bytes() for path, file in manifest(name)["routes"].items()}
+    routes["/products.json"] = products_route(catalog(name))
+    return routes
+
+
+def documents(name: str) -> Dict[str, str]:
+    # The HTML pages of a store by request path
+    directory = STORES / name
+    return {path: (directory / file).read_text() for path, file in manifest(name)["routes"].items()
+            if file.endswith(".html")}
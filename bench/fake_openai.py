@@ -0,0 +1,53 @@
+"""Chat-completions endpoint for StubServer so LLM fallbacks run offline.
+
+Point the app at it with OPENAI_BASE_URL=<stub url>/v1 and any OPENAI_API_KEY.
+"""
+import json
+import time
+from typing import Dict, List, Tuple
+
+FAQ_REPLY = [{"question": "Do you ship internationally?", "answer": "Yes, to most countries."}]
+CONTACT_REPLY = {"emails": ["support@example.com"], "phones": ["+14155550134"]}
+ABOUT_REPLY = "A small brand making everyday essentials."
+
+
+class FakeOpenAI:
+    """Answers chat.completions requests based on which extraction the prompt asks for; records every prompt."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.prompts: List[str] = []
+
+    def reply_for(self, prompt: str) -> str:
+        if prompt.startswith("You are given text from several pages"):
+            sections = [line[4:].strip() for line in prompt.splitlines() if line.startswith("### ")]
+            replies = {"faqs": FAQ_REPLY, "contact": CONTACT_REPLY, "about": ABOUT_REPLY}
+            return json.dumps({kind: replies[kind] for kind in sections if kind in replies})
+        if prompt.startswith("Extract all FAQ"):
+            return json.dumps(FAQ_REPLY)
+        if prompt.startswith("Extract all email"):
+            return json.dumps(CONTACT_REPLY)
+        if prompt.startswith("List 5 direct competitor"):
+            return "https://competitor-one.example\nhttps://competitor-two.example"
+        return ABOUT_REPLY
+
+    def __call__(self, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        request = json.loads(body or b"{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        self.prompts.append(prompt)
+        if self.delay:
+            time.sleep(self.delay)
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.reply_for(prompt)}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 16, "total_tokens": len(prompt) // 4 + 16},
+        }
+        return 200, {"Content-Type": "application/json"}, json.dumps(payload).encode()
+
+
+def routes(fake: FakeOpenAI) -> Dict[str, FakeOpenAI]:
+    return {"/v1/chat/completions": fake}
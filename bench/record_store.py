@@ -0,0 +1,101 @@
+"""Records a live Shopify store into fixtures/stores/<name> for the fetch-insights benchmark.
+
+Run from the repository root: python -m bench.record_store https://store.example NAME [--max-pages N]
+Saves the homepage, the sitemap index with its page sitemaps, the catalog from /products.json and every
+policy, FAQ, about and contact page the scraper would look at, then writes the store.json manifest that
+bench.corpus replays.
+"""
+import argparse
+import json
+import sys
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.parsing import (classify_links, classify_sitemap_urls, is_content_sitemap, iter_sitemap_locs, make_soup,
+                         rank_faq_candidates)
+from app.scraper import PRODUCTS_PAGE_LIMIT
+from bench.corpus import STORES
+
+PROBE_PATHS = [
+    '/policies/privacy-policy', '/pages/privacy-policy', '/policies/refund-policy', '/pages/refund-policy',
+    '/policies/return-policy', '/pages/faq', '/pages/faqs', '/faq', '/pages/help', '/pages/support',
+    '/pages/about', '/pages/about-us', '/about-us', '/pages/our-story', '/pages/contact', '/contact',
+]
+FAQ_CANDIDATES = 6
+
+
+def file_name(path: str) -> str:
+    if path.endswith(".xml"):
+        return path.strip("/").replace("/", "__")
+    return "pages/" + (path.strip("/").replace("/", "__") or "home") + ".html"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("name")
+    parser.add_argument("--max-pages", type=int, default=8, help="catalog pages of 250 products to record")
+    args = parser.parse_args()
+    base_url = args.url.rstrip("/")
+    directory = STORES / args.name
+    routes = {}
+
+    with httpx.Client(follow_redirects=True, timeout=20, headers={"User-Agent": "Mozilla/5.0"}) as client:
+        def record(path: str) -> None:
+            if path in routes:
+                return
+            resp = client.get(base_url + path)
+            expected = "xml" if path.endswith(".xml") else "html"
+            if resp.status_code != 200 or expected not in resp.headers.get("content-type", ""):
+                return
+            target = directory / file_name(path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(resp.text)
+            routes[path] = file_name(path)
+
+        record("/")
+        if "/" not in routes:
+            print(f"{base_url} did not return a homepage", file=sys.stderr)
+            return 1
+        sitemap_urls = []
+        record("/sitemap.xml")
+        if "/sitemap.xml" in routes:
+            for kind, loc in iter_sitemap_locs((directory / routes["/sitemap.xml"]).read_bytes()):
+                path = urlsplit(loc).path
+                if kind == "url":
+                    sitemap_urls.append(loc)
+                elif is_content_sitemap(loc):
+                    record(path)
+                    if path in routes:
+                        sitemap_urls.extend(loc for kind, loc in iter_sitemap_locs((directory / routes[path]).read_bytes())
+                                            if kind == "url")
+        index = classify_sitemap_urls(sitemap_urls, base_url)
+        links = classify_links(make_soup((directory / routes["/"]).read_text()), base_url)
+        linked = [*links['policy_links'].get('privacy', []), *links['policy_links'].get('refund', []),
+                  links['contact_url'], links['about_url'],
+                  *rank_faq_candidates(links['anchors'], base_url)[:FAQ_CANDIDATES],
+                  *index['privacy'], *index['refund'], *index['about'], *index['contact'],
+                  *index['faq'][:FAQ_CANDIDATES]]
+        for url in [base_url + path for path in PROBE_PATHS] + [url for url in linked if url]:
+            if urlsplit(url).netloc == urlsplit(base_url).netloc:
+                record(urlsplit(url).path.rstrip("/") or "/")
+
+        products = []
+        for page in range(1, args.max_pages + 1):
+            resp = client.get(f"{base_url}/products.json", params={"limit": PRODUCTS_PAGE_LIMIT, "page": page})
+            items = resp.json().get("products", []) if resp.status_code == 200 else []
+            products.extend(items)
+            if len(items) < PRODUCTS_PAGE_LIMIT:
+                break
+
+    (directory / "products.json").write_text(json.dumps({"products": products}, indent=1) + "\n")
+    manifest = {"description": f"Recorded from {base_url}", "products": "products.json", "products_repeat": 1,
+                "routes": routes}
+    (directory / "store.json").write_text(json.dumps(manifest, indent=2) + "\n")
+    print(json.dumps({"store": args.name, "pages": len(routes), "products": len(products)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
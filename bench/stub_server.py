@@ -0,0 +1,95 @@
+import collections
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+# A callable route gets the request target, headers and body and returns (status, headers, body)
+Route = Union[bytes, str, Callable[[str, Dict[str, str], bytes], Tuple[int, Dict[str, str], bytes]]]
+
+
+class StubServer:
+    """Local HTTP/1.1 server for scraper checks and benchmarks; counts requests and TCP connections."""
+
+    def __init__(self, routes: Dict[str, Route], latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.routes = routes
+        self.latency = latency
+        self.requests = collections.Counter()
+        self.statuses = collections.Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.statuses.clear()
+            self.connections = 0
+
+    def _respond(self, target: str, headers: Dict[str, str], body: bytes = b"") -> Tuple[int, Dict[str, str], bytes]:
+        route = self.routes.get(urlsplit(target).path.rstrip("/") or "/")
+        if route is None:
+            return 404, {"Content-Type": "text/html"}, b"<html><body>Not found</body></html>"
+        if callable(route):
+            return route(target, headers, body)
+        # Static routes carry an ETag and answer conditional GETs with 304
+        body = route.encode() if isinstance(route, str) else route
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"Content-Type": "text/html; charset=utf-8", "ETag": etag}, body
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                with stub._lock:
+                    stub.connections += 1
+                super().setup()
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._handle(b"")
+
+            def do_POST(self):
+                self._handle(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+            def _handle(self, request_body: bytes):
+                with stub._lock:
+                    stub.requests[urlsplit(self.path).path] += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, headers, body = stub._respond(self.path, dict(self.headers), request_body)
+                with stub._lock:
+                    stub.statuses[status] += 1
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def __enter__(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()